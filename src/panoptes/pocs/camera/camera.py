@@ -112,6 +112,9 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         self._current_observation = None
         self._is_exposing_event = threading.Event()
         self._is_observing_event = threading.Event()
+        # Set whenever the camera is not observing, see `wait_for_observation`.
+        self._observation_finished_event = threading.Event()
+        self._observation_finished_event.set()
         self._readout_complete = False
         self._exposure_error = None
 
@@ -322,6 +325,18 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         """ True if an observation is currently under, otherwise False. """
         return self._is_observing_event.is_set()
 
+    def wait_for_observation(self, timeout=None):
+        """Wait for the current observation, if any, to finish.
+
+        Args:
+            timeout (float, optional): Max number of seconds to wait, or None
+                (the default) to wait until the observation is finished.
+
+        Returns:
+            bool: True if the camera is no longer observing, False on timeout.
+        """
+        return self._observation_finished_event.wait(timeout=timeout)
+
     @property
     def waiting_for_readout(self):
         """True if the most recent readout has not finished. Should be set in `write_fits`"""
@@ -421,6 +436,7 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
             dict: The metadata from the event.
         """
         # Set the camera is_observing.
+        self._observation_finished_event.clear()
         self._is_observing_event.set()
 
         # Setup the observation
@@ -453,9 +469,8 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         t.start()
 
         if blocking:
-            while self.is_observing:
-                self.logger.trace(f'Waiting for observation event')
-                time.sleep(0.5)
+            self.logger.trace(f'Waiting for observation event')
+            self.wait_for_observation()
 
         return metadata
 
@@ -606,10 +621,10 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         try:
             file_path = metadata['filepath']
             if not os.path.exists(file_path):
-                self._is_observing_event.clear()
+                self._observation_complete()
                 raise FileNotFoundError(f"Image {file_path=!r} not found, cannot process.")
         except (KeyError, FileNotFoundError) as e:
-            self._is_observing_event.clear()
+            self._observation_complete()
             raise e
 
         # Do the camera specific processing.
@@ -618,7 +633,7 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         self.logger.debug(f'Finished FITS processing for {file_path}')
 
         # Mark the event as done.
-        self._is_observing_event.clear()
+        self._observation_complete()
         self.logger.debug(f'Camera observing marked complete: {self.is_observing=}')
 
     def write_fits(self, data, header, filename):
@@ -1009,6 +1024,11 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
 
         return file_path
 
+    def _observation_complete(self):
+        """Mark the camera as no longer observing and wake anything waiting on it."""
+        self._is_observing_event.clear()
+        self._observation_finished_event.set()
+
     def _create_subcomponent(self, class_path, subcomponent):
         """
         Creates a subcomponent as an attribute of the camera. Can do this from either an instance
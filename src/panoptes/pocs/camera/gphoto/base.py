@@ -1,18 +1,82 @@
-import os.path
+import multiprocessing
+import os
 import re
+import select
 import shutil
 import subprocess
+import threading
 import time
 from abc import ABC
-from typing import List, Dict, Union
+from contextlib import suppress
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterable, Iterator, List, Union
+from uuid import uuid4
 
 from panoptes.utils import error
 from panoptes.utils.images import cr2 as cr2_utils
-from panoptes.utils.serializers import from_yaml
+from panoptes.utils.utils import get_quantity_value
 from panoptes.utils.utils import listify
 
 from panoptes.pocs.camera import AbstractCamera
 
+# Full path to gphoto2, looked up once rather than searching $PATH for every command.
+GPHOTO2_BIN = shutil.which('gphoto2') or 'gphoto2'
+# Used to line buffer the output of `gphoto2 --shell`, which is otherwise block
+# buffered on a pipe. The shell isn't used without it.
+STDBUF_BIN = shutil.which('stdbuf')
+
+# Command line options that have an equivalent `gphoto2 --shell` command.
+SHELL_OPTIONS = {
+    '--get-config': 'get-config',
+    '--set-config': 'set-config',
+    '--set-config-index': 'set-config-index',
+    '--set-config-value': 'set-config-value',
+}
+
+# Worker processes for the CR2 -> FITS conversion, shared by all gphoto2 cameras.
+# Created on first use, see `get_cr2_pool`.
+_cr2_pool = None
+_cr2_pool_lock = threading.Lock()
+
+# Matches the lines of a property in the `--list-all-config` output, which is
+# parsed as bytes, see `get_command_result`.
+PROPERTY_LINE_RE = re.compile(
+    rb'^(?:(?P<label>Label:.*)|(?P<type>Type:.*)|(?P<current>Current:.*)|(?P<readonly>Readonly:.*)'
+    rb'|(?P<choice>Choice:\s*(?P<choice_idx>\d+)\s*(?P<choice_name>.*))'
+    rb'|(?P<printable>Printable:.*)|(?P<help>Help:.*))$'
+)
+
+
+def get_cr2_pool() -> ProcessPoolExecutor:
+    """ Get the process pool for the CR2 -> FITS conversion, creating it if needed.
+
+    The workers are started from a `forkserver` rather than forked from the
+    (threaded) camera process, so they can't inherit a lock held by another thread.
+    """
+    global _cr2_pool
+    with _cr2_pool_lock:
+        if _cr2_pool is None:
+            try:
+                mp_context = multiprocessing.get_context('forkserver')
+            except ValueError:  # pragma: no cover
+                mp_context = multiprocessing.get_context('spawn')
+
+            _cr2_pool = ProcessPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) // 2),
+                                            mp_context=mp_context)
+
+        return _cr2_pool
+
+
+def _discard_cr2_pool(pool: ProcessPoolExecutor):
+    """ Stop using a pool whose worker died, so `get_cr2_pool` creates a new one. """
+    global _cr2_pool
+    with _cr2_pool_lock:
+        if _cr2_pool is pool:
+            _cr2_pool = None
+
+    pool.shutdown(wait=False)
+
 
 class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
 
@@ -20,6 +84,8 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
 
     Args:
         config(Dict):   Config key/value pairs, defaults to empty dict.
+        use_shell(bool): Send the config commands to a long-lived `gphoto2 --shell`
+            process rather than starting gphoto2 for each one, default True.
     """
 
     def __init__(self, *arg, **kwargs):
@@ -28,6 +94,15 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
         # Setup a holder for the exposure process.
         self._command_proc = None
 
+        # A long-lived `gphoto2 --shell` process used for config commands.
+        self._shell = None
+        self._shell_cmd = None
+        self._shell_marker = None
+        self._use_shell = kwargs.get('use_shell', True)
+
+        # Holder for the output of `load_properties`.
+        self._properties_cache = None
+
         self.logger.info(f'GPhoto2 camera {self.name} created on {self.port}')
 
     @property
@@ -50,6 +125,15 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
     def connect(self):
         raise NotImplementedError
 
+    def disconnect(self):
+        """ Release the camera, stopping the `gphoto2 --shell` process if running. """
+        self.stop_shell()
+        self._connected = False
+
+    def __del__(self):
+        with suppress(Exception):
+            self.stop_shell()
+
     @property
     def is_exposing(self):
         if self._command_proc is not None and self._command_proc.poll() is not None:
@@ -59,83 +143,321 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
 
     def process_exposure(self, metadata, **kwargs):
         """Converts the CR2 to FITS then processes image."""
-        # Wait for exposure to complete. Timeout handled by exposure thread.
-        while self.is_exposing:
-            time.sleep(1)
+        # Wait for exposure to complete.
+        exptime = get_quantity_value(metadata['exptime'], unit='second')
+        self.wait_for_command(timeout=exptime + self.readout_time + self.timeout)
 
         self.logger.debug(f'Processing Canon DSLR exposure with {metadata=!r}')
         file_path = metadata['filepath']
+        cr2_pool = get_cr2_pool()
         try:
             self.logger.debug(f"Converting CR2 -> FITS: {file_path}")
-            fits_path = cr2_utils.cr2_to_fits(file_path, headers=metadata, remove_cr2=False)
+            # Convert in a worker process so the decoding doesn't hold the GIL.
+            fits_path = cr2_pool.submit(cr2_utils.cr2_to_fits, file_path,
+                                        headers=metadata, remove_cr2=False).result()
+        except Exception as e:
+            self.logger.error(f'Error converting {file_path} to FITS on {self}: {e!r}')
+            if isinstance(e, BrokenProcessPool):
+                _discard_cr2_pool(cr2_pool)
+            self._observation_complete()
+            return
+
+        try:
             metadata['filepath'] = fits_path
             super(AbstractGPhotoCamera, self).process_exposure(metadata, **kwargs)
         except TimeoutError:
             self.logger.error(f'Error processing exposure for {file_path} on {self}')
 
+    def wait_for_command(self, timeout: float = None):
+        """ Wait for the running gphoto2 command to finish.
+
+        The process is killed if it is still running after `timeout` seconds.
+        """
+        command_proc = self._command_proc
+        if command_proc is not None:
+            try:
+                command_proc.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                self.logger.warning(f'Timeout waiting for gphoto2 command {command_proc.pid}')
+                command_proc.kill()
+                command_proc.wait()
+
+        self._is_exposing_event.clear()
+
     def command(self, cmd: Union[List[str], str]):
-        """ Run gphoto2 command. """
+        """ Run gphoto2 command.
+
+        Commands that only get or set config values are written to a long-lived
+        `gphoto2 --shell` process, which avoids starting a new gphoto2 (and
+        re-enumerating the USB device) for every call. Any other command, e.g.
+        an exposure, stops the shell so the camera can be claimed by a new
+        gphoto2 process.
+        """
 
         # Test to see if there is a running command already
         if self.is_exposing:
             raise error.InvalidCommand("Command already running")
-        else:
-            # Build the command.
-            run_cmd = [shutil.which('gphoto2')]
-            if self.port is not None:
-                run_cmd.extend(['--port', self.port])
-            run_cmd.extend(listify(cmd))
 
-            self.logger.debug(f"gphoto2 command: {run_cmd!r}")
+        cmd = listify(cmd)
+
+        # Any change to the camera config makes the loaded properties stale.
+        if any(arg.startswith('--set-config') for arg in cmd):
+            self._properties_cache = None
 
+        shell_lines = self._get_shell_lines(cmd)
+        if shell_lines is not None and self._start_shell():
+            # A config name that can't exist, so gphoto2 echoes it back in the error.
+            marker = f'/__end_{uuid4().hex}__'
+            shell_lines.append(f'get-config {marker}')
+            self.logger.debug(f"gphoto2 shell commands: {shell_lines!r}")
             try:
-                self._command_proc = subprocess.Popen(
-                    run_cmd,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    universal_newlines=True,
-                )
+                self._shell.stdin.write(''.join(f'{line}\n' for line in shell_lines).encode())
+                self._shell.stdin.flush()
             except OSError as e:
-                raise error.InvalidCommand(f"Can't send command to gphoto2. {e} \t {run_cmd}")
-            except ValueError as e:
-                raise error.InvalidCommand(f"Bad parameters to gphoto2. {e} \t {run_cmd}")
-            except Exception as e:
-                raise error.PanError(e)
+                self.logger.warning(f'Problem writing to gphoto2 shell, falling back: {e!r}')
+                self._use_shell = False
+            else:
+                self._shell_cmd = cmd
+                self._shell_marker = marker
+                return
+
+        self._start_command(cmd)
 
-    def get_command_result(self, timeout: float = 10) -> Union[List[str], None]:
+    def _start_command(self, cmd: List[str]):
+        """ Run the gphoto2 command as a new gphoto2 process. """
+        # Release the camera so the new gphoto2 process can claim it.
+        self.stop_shell()
+
+        # Build the command.
+        run_cmd = [GPHOTO2_BIN]
+        if self.port is not None:
+            run_cmd.extend(['--port', self.port])
+        run_cmd.extend(cmd)
+
+        self.logger.debug(f"gphoto2 command: {run_cmd!r}")
+
+        try:
+            self._command_proc = subprocess.Popen(
+                run_cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            raise error.InvalidCommand(f"Can't send command to gphoto2. {e} \t {run_cmd}")
+        except ValueError as e:
+            raise error.InvalidCommand(f"Bad parameters to gphoto2. {e} \t {run_cmd}")
+        except Exception as e:
+            raise error.PanError(e)
+
+    def get_command_result(self, timeout: float = 10) -> Union[List[bytes], None]:
         """ Get the output from the command.
 
         Accepts a `timeout` param for communicating with the process.
 
-        Returns a list of strings corresponding to the output from the gphoto2
-        camera or `None` if no command has been specified.
+        Returns a list of the (undecoded) lines of output from the gphoto2
+        camera or `None` if no command has been specified. The output is parsed
+        as bytes and only the values that are needed get decoded.
         """
-        if self._command_proc is None:
+        if self._shell_marker is None and self._command_proc is None:
             return None
 
-        self.logger.debug(f"Getting output from proc {self._command_proc.pid}")
+        return list(self.iter_command_result(timeout=timeout))
+
+    def iter_command_result(self, timeout: float = 10) -> Iterator[bytes]:
+        """ Iterate over the output from the command as it is read.
+
+        Same as `get_command_result` but yields each (undecoded) line as soon as
+        it is read, so the caller can stop early without collecting all the output.
+        """
+        if self._shell_marker is not None:
+            yield from self._get_shell_result(timeout=timeout)
+            return
+
+        command_proc = self._command_proc
+        if command_proc is None:
+            return
+
+        self.logger.debug(f"Getting output from proc {command_proc.pid}")
 
         try:
-            outs, errs = self._command_proc.communicate(timeout=timeout)
-        except subprocess.TimeoutExpired:
-            self.logger.debug(f"Timeout while waiting. Killing process {self._command_proc.pid}")
-            self._command_proc.kill()
-            outs, errs = self._command_proc.communicate()
+            yield from self._read_lines(command_proc.stdout.fileno(), timeout=timeout)
+        except TimeoutError:
+            self.logger.debug(f"Timeout while waiting. Killing process {command_proc.pid}")
+            command_proc.kill()
+        finally:
+            # Also drains any output left if the caller stopped early.
+            try:
+                _, errs = command_proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                command_proc.kill()
+                _, errs = command_proc.communicate()
 
-        self.logger.trace(f'gphoto2 output: {outs=!r}')
-        if errs != '':
-            self.logger.error(f'gphoto2 error: {errs!r}')
+            if errs:
+                self.logger.error(f'gphoto2 error: {errs!r}')
 
-        if isinstance(outs, str):
-            outs = outs.split('\n')
+            self._command_proc = None
 
-        self._command_proc = None
+    def stop_shell(self, timeout: float = 5):
+        """ Stop the `gphoto2 --shell` process, if running. """
+        if self._shell is None:
+            return
+
+        self.logger.debug(f'Stopping gphoto2 shell {self._shell.pid}')
+        try:
+            self._shell.stdin.write(b'exit\n')
+            self._shell.stdin.flush()
+            self._shell.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self._shell.kill()
+            self._shell.wait()
+
+        self._shell = None
+        self._shell_cmd = None
+        self._shell_marker = None
+
+    def _start_shell(self) -> bool:
+        """ Start the `gphoto2 --shell` process if needed, returning True if available. """
+        if self._shell is not None and self._shell.poll() is None:
+            return True
+
+        self._shell = None
+        if not self._use_shell or STDBUF_BIN is None:
+            return False
+
+        # Line buffered so the output of a command is written before the next one runs.
+        run_cmd = [STDBUF_BIN, '-oL', GPHOTO2_BIN]
+        if self.port is not None:
+            run_cmd.extend(['--port', self.port])
+        run_cmd.append('--shell')
+
+        self.logger.debug(f"Starting gphoto2 shell: {run_cmd!r}")
+        try:
+            self._shell = subprocess.Popen(
+                run_cmd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except Exception as e:
+            self.logger.warning(f"Can't start gphoto2 shell, using single commands: {e!r}")
+            self._use_shell = False
+            return False
+
+        return True
+
+    def _get_shell_result(self, timeout: float = 10) -> List[bytes]:
+        """ Read the shell output until the marker for the pending command is seen.
+
+        The marker is echoed in an error, so it arrives on stderr. Any output of
+        the commands has been written to stdout by then, so it is read from the
+        pipe after the marker. If there is still a partial line, the shell is
+        reset and the command rerun as a single gphoto2 process rather than
+        returning part of the output. Errors are logged, as for a single command.
+
+        If the shell dies or does not respond then it is assumed that `--shell`
+        is not supported and the command is rerun as a single gphoto2 process.
+        """
+        cmd = self._shell_cmd
+        marker = self._shell_marker.encode()
+        self._shell_cmd = None
+        self._shell_marker = None
+
+        out_fd = self._shell.stdout.fileno()
+        err_fd = self._shell.stderr.fileno()
+        output = b''
+        err_buffer = b''
+        errors = list()
+        end_time = time.monotonic() + timeout
+        try:
+            while True:
+                remaining = end_time - time.monotonic()
+                readable = select.select([out_fd, err_fd], [], [], max(remaining, 0))[0]
+                if not readable:
+                    raise TimeoutError
+                if out_fd in readable:
+                    chunk = os.read(out_fd, 4096)
+                    if chunk == b'':
+                        raise EOFError
+                    output += chunk
+                if err_fd in readable:
+                    chunk = os.read(err_fd, 4096)
+                    if chunk == b'':
+                        raise EOFError
+                    *err_lines, err_buffer = (err_buffer + chunk).split(b'\n')
+                    # Skip the `*** Error ***` lines around each message and earlier markers.
+                    errors.extend(line for line in err_lines
+                                  if line.strip() and not line.startswith(b'***'))
+                    if any(marker in line for line in errors):
+                        break
+
+            while select.select([out_fd], [], [], 0)[0]:
+                chunk = os.read(out_fd, 4096)
+                if chunk == b'':
+                    break
+                output += chunk
+        except (TimeoutError, EOFError, OSError):
+            self.logger.warning('No response from gphoto2 shell, using single commands')
+            self._use_shell = False
+        else:
+            errors = [line for line in errors if b'/__end_' not in line]
+            if errors:
+                self.logger.error(f'gphoto2 error: {errors!r}')
+
+            if output == b'' or output.endswith(b'\n'):
+                lines = [line.rstrip(b'\r') for line in output.split(b'\n')[:-1]]
+                self.logger.trace(f'gphoto2 shell output: {lines=!r}')
+                return lines
+
+            self.logger.warning('Output from gphoto2 shell still arriving, resetting the shell')
+
+        self._start_command(cmd)
+        return self.get_command_result(timeout=timeout)
+
+    @staticmethod
+    def _read_lines(fd: int, timeout: float = 10) -> Iterator[bytes]:
+        """ Yield the lines read from a file descriptor until the end of the output.
+
+        Raises a `TimeoutError` if the output hasn't ended after `timeout` seconds.
+        """
+        end_time = time.monotonic() + timeout
+        buffer = b''
+        while True:
+            remaining = end_time - time.monotonic()
+            if not select.select([fd], [], [], max(remaining, 0))[0]:
+                raise TimeoutError
+
+            chunk = os.read(fd, 4096)
+            if chunk == b'':
+                break
 
-        return outs
+            buffer += chunk
+            *complete_lines, buffer = buffer.split(b'\n')
+            yield from complete_lines
+
+        if buffer:
+            yield buffer
+
+    def _get_shell_lines(self, cmd: List[str]) -> Union[List[str], None]:
+        """ Translate gphoto2 options into shell commands, or None if not possible.
+
+        The shell splits its input on whitespace, so values containing spaces are quoted.
+        """
+        if len(cmd) == 0 or len(cmd) % 2:
+            return None
+
+        shell_lines = list()
+        for option, value in zip(cmd[::2], cmd[1::2]):
+            if option not in SHELL_OPTIONS:
+                return None
+            if any(char.isspace() for char in value):
+                value = f'"{value}"'
+            shell_lines.append(f'{SHELL_OPTIONS[option]} {value}')
+
+        return shell_lines
 
     def set_property(self, prop: str, val: Union[str, int]):
         """ Set a property on the camera """
-        set_cmd = ['--set-config', f'{prop}="{val}"']
+        set_cmd = ['--set-config', f'{prop}={val}']
 
         self.command(set_cmd)
 
@@ -151,6 +473,21 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
             prop2value (dict or None): A dict with keys corresponding to the property to
                 be set and values corresponding to the literal value.
         """
+        set_cmd = self.get_set_properties_cmd(prop2index=prop2index, prop2value=prop2value)
+
+        self.command(set_cmd)
+
+        # Forces the command to wait
+        self.get_command_result()
+
+    @staticmethod
+    def get_set_properties_cmd(prop2index: Dict[str, int] = None,
+                               prop2value: Dict[str, str] = None) -> List[str]:
+        """ Build the gphoto2 arguments for `set_properties`.
+
+        This allows the arguments to be combined with other commands so that
+        everything is sent to the camera at once.
+        """
         set_cmd = list()
         if prop2index:
             for prop, val in prop2index.items():
@@ -158,80 +495,95 @@ class AbstractGPhotoCamera(AbstractCamera, ABC):  # pragma: no cover
 
         if prop2value:
             for prop, val in prop2value.items():
-                set_cmd.extend(['--set-config-value', f'{prop}="{val}"'])
+                set_cmd.extend(['--set-config-value', f'{prop}={val}'])
 
-        self.command(set_cmd)
+        return set_cmd
 
-        # Forces the command to wait
-        self.get_command_result()
+    @staticmethod
+    def get_config_values(lines: Iterable[bytes], props: Iterable[str]) -> Dict[str, str]:
+        """ Get the `Current` value of each of the `props` from `--get-config` output.
+
+        The output doesn't name the property, so the values are matched to `props`
+        in the order they were requested. The output for a property ends with an
+        `END` line, or with a `<prop> not found` error if the errors are included.
+        A property without a `Current` line gets an empty string.
+
+        The errors are logged rather than returned by `get_command_result`, so a
+        property that can't be read should be requested on its own, see `get_property`.
+        """
+        props = list(props)
+        values = dict.fromkeys(props, '')
+        prop_iter = iter(props)
+        prop = next(prop_iter, None)
+        for line in lines or list():
+            if prop is None:
+                break
+
+            if line.startswith(b'Current:'):
+                values[prop] = line[8:].lstrip().decode(errors='replace')
+            elif line == b'END' or line.startswith(f'{prop} not found'.encode()):
+                prop = next(prop_iter, None)
+
+        return values
 
     def get_property(self, prop: str) -> str:
         """ Gets a property from the camera """
         set_cmd = ['--get-config', f'{prop}']
 
         self.command(set_cmd)
-        result = self.get_command_result()
 
-        output = ''
-        for line in result:
-            match = re.match(r'Current:\s*(.*)', line)
-            if match:
-                output = match.group(1)
+        # Stops reading at the END of the property.
+        return self.get_config_values(self.iter_command_result(), [prop])[prop]
 
-        return output
-
-    def load_properties(self) -> dict:
+    def load_properties(self, refresh: bool = False) -> dict:
         """ Load properties from the camera.
 
         Reads all the configuration properties available via gphoto2 and returns
-        as dictionary.
+        as dictionary keyed by the property label. Values are the strings printed
+        by gphoto2, except for `Readonly` and the `Choices` indices, which are ints.
+
+        The properties are cached until a config value is set on the camera.
+
+        Args:
+            refresh (bool): Reload the properties from the camera even if they
+                are cached, default False.
         """
+        if self._properties_cache is not None and not refresh:
+            return self._properties_cache
+
         self.logger.debug('Getting all properties for gphoto2 camera')
         self.command(['--list-all-config'])
-        lines = self.get_command_result()
+        lines = self.iter_command_result()
 
         properties = {}
-        yaml_string = ''
+        prop = None
 
         for line in lines:
-            is_id = len(line.split('/')) > 1
-            is_label = re.match(r'^Label:\s*(.*)', line)
-            is_type = re.match(r'^Type:\s*(.*)', line)
-            is_readonly = re.match(r'^Readonly:\s*(.*)', line)
-            is_current = re.match(r'^Current:\s*(.*)', line)
-            is_choice = re.match(r'^Choice:\s*(\d+)\s*(.*)', line)
-            is_printable = re.match(r'^Printable:\s*(.*)', line)
-            is_help = re.match(r'^Help:\s*(.*)', line)
-
-            if is_label or is_type or is_current or is_readonly:
-                line = f'  {line}'
-            elif is_choice:
-                if int(is_choice.group(1)) == 0:
-                    line = f'  Choices:\n    {int(is_choice.group(1)):d}: {is_choice.group(2)}'
+            match = PROPERTY_LINE_RE.match(line)
+            if match is None:
+                if line == b'' or line == b'END':
+                    continue
+                elif b'/' in line:
+                    # Each property starts with its ID, e.g. `/main/imgsettings/iso`.
+                    prop = {'ID': line.decode(errors='replace')}
                 else:
-                    line = f'    {int(is_choice.group(1)):d}: {is_choice.group(2)}'
-            elif is_printable:
-                line = f'  {line}'
-            elif is_help:
-                line = f'  {line}'
-            elif is_id:
-                line = f'- ID: {line}'
-            elif line == '' or line == 'END':
-                continue
+                    self.logger.debug(f'Line not parsed: {line!r}')
+            elif prop is None:
+                self.logger.debug(f'Line without property ID: {line!r}')
+            elif match.lastgroup == 'choice':
+                choice_name = match.group('choice_name').decode(errors='replace')
+                prop.setdefault('Choices', dict())[int(match.group('choice_idx'))] = choice_name
             else:
-                self.logger.debug(f'Line not parsed: {line}')
+                key, value = line.split(b':', 1)
+                value = value.strip().decode(errors='replace')
+                if match.lastgroup == 'label' and value:
+                    properties[value] = prop
+                elif match.lastgroup == 'readonly':
+                    value = int(value)
 
-            yaml_string += f'{line}\n'
+                prop[key.decode()] = value
 
-        self.logger.debug(yaml_string)
-        properties_list = from_yaml(yaml_string)
-
-        if isinstance(properties_list, list):
-            for prop in properties_list:
-                if prop['Label']:
-                    properties[prop['Label']] = prop
-        else:
-            properties = properties_list
+        self._properties_cache = properties
 
         return properties
 
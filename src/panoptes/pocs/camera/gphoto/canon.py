@@ -4,6 +4,72 @@ from panoptes.utils import error
 from panoptes.utils.time import current_time
 from panoptes.utils.utils import get_quantity_value
 
+# TODO derive these from `load_properties`.
+# The index corresponds to what gphoto2 expects.
+SHUTTER_SPEEDS = {
+    "bulb": "bulb",
+    "30": 30,
+    "25": 25,
+    "20": 20,
+    "15": 15,
+    "13": 13,
+    "10.3": 10.3,
+    "8": 8,
+    "6.3": 6.3,
+    "5": 5,
+    "4": 4,
+    "3.2": 3.2,
+    "2.5": 2.5,
+    "2": 2,
+    "1.6": 1.6,
+    "1.3": 1.3,
+    "1": 1,
+    "0.8": 0.8,
+    "0.6": 0.6,
+    "0.5": 0.5,
+    "0.4": 0.4,
+    "0.3": 0.3,
+    "1/4": 1 / 4,
+    "1/5": 1 / 5,
+    "1/6": 1 / 6,
+    "1/8": 1 / 8,
+    "1/10": 1 / 10,
+    "1/13": 1 / 13,
+    "1/15": 1 / 15,
+    "1/20": 1 / 20,
+    "1/25": 1 / 25,
+    "1/30": 1 / 30,
+    "1/40": 1 / 40,
+    "1/50": 1 / 50,
+    "1/60": 1 / 60,
+    "1/80": 1 / 80,
+    "1/100": 1 / 100,
+    "1/125": 1 / 125,
+    "1/160": 1 / 160,
+    "1/200": 1 / 200,
+    "1/250": 1 / 250,
+    "1/320": 1 / 320,
+    "1/400": 1 / 400,
+    "1/500": 1 / 500,
+    "1/640": 1 / 640,
+    "1/800": 1 / 800,
+    "1/1000": 1 / 1000,
+    "1/1250": 1 / 1250,
+    "1/1600": 1 / 1600,
+    "1/2000": 1 / 2000,
+    "1/2500": 1 / 2500,
+    "1/3200": 1 / 3200,
+    "1/4000": 1 / 4000,
+}
+
+# Lookup tables for `Camera.get_shutterspeed_index`.
+SHUTTER_SPEEDS_KEY_IDX = {key: i for i, key in enumerate(SHUTTER_SPEEDS)}
+SHUTTER_SPEEDS_VALUE_IDX = {val: i for i, val in enumerate(SHUTTER_SPEEDS.values()) if i > 0}
+SHUTTER_SPEEDS_MIN = min(list(SHUTTER_SPEEDS.values())[1:])
+
+# Arguments to take an exposure with a known shutterspeed.
+CAPTURE_ARGS = ('--capture-image-and-download',)
+
 
 class Camera(AbstractGPhotoCamera):
 
@@ -22,6 +88,9 @@ class Camera(AbstractGPhotoCamera):
         super().__init__(*args, **kwargs)
         self.logger.debug("Creating Canon DSLR GPhoto2 camera")
 
+        # Looked up on first connect.
+        self._artist_name = None
+
         if connect:
             self.connect()
 
@@ -40,13 +109,6 @@ class Camera(AbstractGPhotoCamera):
         """
         self.logger.debug('Connecting to Canon gphoto2 camera')
 
-        # Get serial number
-        _serial_number = self.get_property('serialnumber')
-        if not _serial_number:
-            raise error.CameraNotFound(f"Camera not responding: {self}")
-
-        self._serial_number = _serial_number
-
         # Properties to be set upon init.
         prop2index = {
             '/main/capturesettings/autoexposuremode': 3,  # 3 - Manual; 4 - Bulb
@@ -61,7 +123,9 @@ class Camera(AbstractGPhotoCamera):
         }
 
         owner_name = 'PANOPTES'
-        artist_name = self.get_config('pan_id', default=owner_name)
+        if self._artist_name is None:
+            self._artist_name = self.get_config('pan_id', default=owner_name)
+        artist_name = self._artist_name
         copy_right = f'{owner_name}_{current_time().datetime:%Y}'
 
         prop2value = {
@@ -70,11 +134,19 @@ class Camera(AbstractGPhotoCamera):
             'ownername': owner_name,
         }
 
-        self.set_properties(prop2index=prop2index, prop2value=prop2value)
+        # Read the serial number and model before the settings, each on its own, so that a
+        # setting the camera rejects can't stop them being read. With the gphoto2 shell these
+        # don't start a new gphoto2 process, see `AbstractGPhotoCamera.command`.
+        _serial_number = self.get_property('serialnumber')
+        if not _serial_number:
+            raise error.CameraNotFound(f"Camera not responding: {self}")
 
+        self._serial_number = _serial_number
         # TODO check this works on all Canon models.
         self.model = self.get_property('d402')
 
+        self.set_properties(prop2index=prop2index, prop2value=prop2value)
+
         self._connected = True
 
     def _start_exposure(self,
@@ -101,25 +173,23 @@ class Camera(AbstractGPhotoCamera):
         shutterspeed_idx = self.get_shutterspeed_index(seconds=seconds, return_minimum=True)
 
         cmd_args = [
-            f'--set-config', f'iso={iso}',
-            f'--filename', f'{filename}',
-            f'--set-config-index', f'shutterspeed={shutterspeed_idx}',
-            f'--wait-event=1s',
+            '--set-config', f'iso={iso}',
+            '--filename', f'{filename}',
+            '--set-config-index', f'shutterspeed={shutterspeed_idx}',
+            '--wait-event=1s',
         ]
 
         if shutterspeed_idx == 0:
             # Bulb setting.
             cmd_args.extend([
-                f'--set-config-index', 'eosremoterelease=2',
+                '--set-config-index', 'eosremoterelease=2',
                 f'--wait-event={int(seconds):d}s',
-                f'--set-config-index', 'eosremoterelease=4',
-                f'--wait-event-and-download=2s',
+                '--set-config-index', 'eosremoterelease=4',
+                '--wait-event-and-download=2s',
             ])
         else:
             # Known shutterspeed value.
-            cmd_args.extend([
-                f'--capture-image-and-download',
-            ])
+            cmd_args.extend(CAPTURE_ARGS)
 
         try:
             self.command(cmd_args)
@@ -136,75 +206,22 @@ class Camera(AbstractGPhotoCamera):
         If the given seconds does not match a set shutterspeed, the 'bulb' setting
         is returned.
         """
-        seconds = get_quantity_value(seconds, unit='second')
-        # TODO derive these from `load_properties`.
-        # The index corresponds to what gphoto2 expects.
-        shutter_speeds = {
-            "bulb": "bulb",
-            "30": 30,
-            "25": 25,
-            "20": 20,
-            "15": 15,
-            "13": 13,
-            "10.3": 10.3,
-            "8": 8,
-            "6.3": 6.3,
-            "5": 5,
-            "4": 4,
-            "3.2": 3.2,
-            "2.5": 2.5,
-            "2": 2,
-            "1.6": 1.6,
-            "1.3": 1.3,
-            "1": 1,
-            "0.8": 0.8,
-            "0.6": 0.6,
-            "0.5": 0.5,
-            "0.4": 0.4,
-            "0.3": 0.3,
-            "1/4": 1 / 4,
-            "1/5": 1 / 5,
-            "1/6": 1 / 6,
-            "1/8": 1 / 8,
-            "1/10": 1 / 10,
-            "1/13": 1 / 13,
-            "1/15": 1 / 15,
-            "1/20": 1 / 20,
-            "1/25": 1 / 25,
-            "1/30": 1 / 30,
-            "1/40": 1 / 40,
-            "1/50": 1 / 50,
-            "1/60": 1 / 60,
-            "1/80": 1 / 80,
-            "1/100": 1 / 100,
-            "1/125": 1 / 125,
-            "1/160": 1 / 160,
-            "1/200": 1 / 200,
-            "1/250": 1 / 250,
-            "1/320": 1 / 320,
-            "1/400": 1 / 400,
-            "1/500": 1 / 500,
-            "1/640": 1 / 640,
-            "1/800": 1 / 800,
-            "1/1000": 1 / 1000,
-            "1/1250": 1 / 1250,
-            "1/1600": 1 / 1600,
-            "1/2000": 1 / 2000,
-            "1/2500": 1 / 2500,
-            "1/3200": 1 / 3200,
-            "1/4000": 1 / 4000,
-        }
+        # Plain numbers are already in seconds, e.g. when called from `_start_exposure`.
+        if not isinstance(seconds, (int, float)):
+            seconds = get_quantity_value(seconds, unit='second')
 
-        try:
-            # First check by key.
-            return list(shutter_speeds.keys()).index(seconds)
-        except ValueError:
-            # Then check by value.
-            try:
-                # Check minimum of everything after 'bulb'.
-                if return_minimum and seconds < min(list(shutter_speeds.values())[1:]):
-                    return len(shutter_speeds) - 1
-                else:
-                    return list(shutter_speeds.values()).index(seconds)
-            except ValueError:
-                return 0
+        # First check by key.
+        idx = SHUTTER_SPEEDS_KEY_IDX.get(seconds)
+        if idx is not None:
+            return idx
+
+        # Then check by value.
+        idx = SHUTTER_SPEEDS_VALUE_IDX.get(seconds)
+        if idx is not None:
+            return idx
+
+        # Check minimum of everything after 'bulb'.
+        if return_minimum and seconds < SHUTTER_SPEEDS_MIN:
+            return len(SHUTTER_SPEEDS) - 1
+
+        return 0
@@ -1,6 +1,7 @@
+import shlex
 from collections import deque
 from threading import Thread
-from typing import List, Union
+from typing import Iterator, List, Union
 
 import requests
 from pydantic import AnyHttpUrl
@@ -28,6 +29,16 @@ class Camera(CanonCamera):
 
         return self._is_exposing_event.is_set()
 
+    def wait_for_command(self, timeout: float = None):
+        """Wait for the remote command thread to finish."""
+        command_proc = self._command_proc
+        if command_proc is not None:
+            command_proc.join(timeout=timeout)
+            if command_proc.is_alive():
+                self.logger.warning(f'Timeout waiting for remote gphoto2 command on {self.name}')
+
+        self._is_exposing_event.clear()
+
     def command(self, cmd, endpoint: AnyHttpUrl = None):
         """Run the gphoto2 command remotely.
 
@@ -36,7 +47,8 @@ class Camera(CanonCamera):
         """
         endpoint = endpoint or self.endpoint
 
-        arguments = ' '.join(cmd)
+        # Quote any values with spaces so the service can split the arguments.
+        arguments = ' '.join(shlex.quote(arg) for arg in cmd)
         # Add the port
         if '--port' not in arguments:
             arguments = f'--port {self.port} {arguments}'
@@ -56,8 +68,11 @@ class Camera(CanonCamera):
         self._command_proc = Thread(target=do_command, name='RemoteGphoto2Command')
         self._command_proc.start()
 
-    def get_command_result(self, timeout: float = 10) -> Union[List[str], None]:
-        """Get the output from the remote camera service."""
+    def get_command_result(self, timeout: float = 10) -> Union[List[bytes], None]:
+        """Get the output from the remote camera service.
+
+        The lines are returned as bytes to match the local gphoto2 cameras.
+        """
         output = None
         try:
             self._command_proc.join(timeout=self.timeout)
@@ -68,7 +83,7 @@ class Camera(CanonCamera):
         else:
             response = self.response_queue.pop()
             if response['output'] > '':
-                output = response['output'].split('\n')
+                output = response['output'].encode().split(b'\n')
                 self.logger.debug(f'Remote gphoto2 output: {output!r}')
 
             if response['error'] > '':
@@ -77,6 +92,10 @@ class Camera(CanonCamera):
 
         return output
 
+    def iter_command_result(self, timeout: float = 10) -> Iterator[bytes]:
+        """Iterate over the output from the remote camera service."""
+        yield from self.get_command_result(timeout=timeout) or list()
+
     def _create_fits_header(self, seconds, dark=None, metadata=None) -> dict:
         fits_header = super(Camera, self)._create_fits_header(seconds, dark=dark, metadata=metadata)
         return {k.lower(): v for k, v in dict(fits_header).items()}
@@ -318,7 +318,7 @@ class POCS(PanStateMachine, PanBase):
             self.logger.warning("Found the following invalid checks to ignore in "
                                 f"is_safe: {missing_keys}. Valid keys are: "
                                 f"{list(is_safe_values.keys())}.")
-        safe = all([v for k, v in is_safe_values.items() if k not in ignore])
+        safe = all(v for k, v in is_safe_values.items() if k not in ignore)
 
         # Insert safety reading
         self.db.insert_current('safety', is_safe_values)
@@ -130,6 +130,19 @@ class AbstractDome(PanBase):
         """
         return NotImplementedError()
 
+    def get_status(self):
+        """Read the state of the dome once, for use in logic.
+
+        Sub-classes that have to ask the controller for each of `is_open` and
+        `is_closed` should override this to read the state only once.
+
+        Returns:
+            dict: With `is_connected`, `is_open` and `is_closed` entries.
+        """
+        return dict(is_connected=self.is_connected,
+                    is_open=self.is_open,
+                    is_closed=self.is_closed)
+
     @property
     @abstractmethod
     def status(self):  # pragma: no cover
@@ -97,6 +97,13 @@ class AstrohavenDome(abstract_serial_dome.AbstractSerialDome):
         self.logger.warning(f'AstrohavenDome.close wrong final state: {v!r}')
         return False
 
+    def get_status(self):
+        """Read the state of the dome from the controller once."""
+        v = self._read_latest_state()
+        return dict(is_connected=self.is_connected,
+                    is_open=v == Protocol.BOTH_OPEN,
+                    is_closed=v == Protocol.BOTH_CLOSED)
+
     @property
     def status(self):
         """Return a dict with dome's current status."""
@@ -40,6 +40,13 @@ class Dome(dome.AbstractDome):
     def is_closed(self):
         return self.read_slit_state() == 'Closed'
 
+    def get_status(self):
+        """Read the slit state once, see `AbstractDome.get_status` for the keys."""
+        slit_state = self.read_slit_state()
+        return dict(is_connected=self.is_connected,
+                    is_open=slit_state == 'Open',
+                    is_closed=slit_state == 'Closed')
+
     def read_slit_state(self):
         if self.is_connected:
             self.write(self._get_command('dome/slit_state.js'))
@@ -1,29 +1,47 @@
+import json
+import multiprocessing
 import os
-from collections import OrderedDict
+import queue
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
 from datetime import datetime
-from multiprocessing import Process
 from pathlib import Path
 from typing import Dict, Optional
 
+import numpy as np
 from astropy import units as u
-from astropy.coordinates import get_moon
-from astropy.coordinates import get_sun
+from astropy.coordinates import Longitude
 from panoptes.utils import error
-from panoptes.utils.time import current_time, CountdownTimer
+from panoptes.utils.time import current_time, flatten_time, CountdownTimer
 
-import panoptes.pocs.camera.fli
 from panoptes.pocs.base import PanBase
 from panoptes.pocs.camera import AbstractCamera
 from panoptes.pocs.dome import AbstractDome
-from panoptes.pocs.images import Image
 from panoptes.pocs.mount.mount import AbstractMount
 from panoptes.pocs.scheduler import BaseScheduler
+from panoptes.pocs.scheduler.observation.base import Exposure
 from panoptes.pocs.scheduler.observation.base import Observation
 from panoptes.utils import images as img_utils
 from panoptes.utils.images import fits as fits_utils
-from panoptes.pocs.utils.cli.image import upload_image
 from panoptes.pocs.utils.location import create_location_from_config
 
+# Max number of (time, body) entries kept by the ephemeris cache.
+EPHEMERIS_CACHE_SIZE = 32
+# Seconds to wait for more exposures before sending a batch of uploads.
+UPLOAD_BATCH_WAIT = 1.
+# Seconds a config value is reused by `Observatory._cfg`.
+CONFIG_CACHE_TTL = 60.
+# Max number of plate solves waiting in the post-processing pool at once.
+MAX_PENDING_SOLVES = 4
+# Seconds `Observatory.analyze_recent` waits for a background plate solve.
+PLATE_SOLVE_WAIT = 90.
+# Default file for the dome operation log relative to `directories.base`, see
+# `Observatory.close_dome`.
+DOME_OPERATION_LOG = 'logs/dome_operations.log'
+
 
 class Observatory(PanBase):
 
@@ -46,17 +64,26 @@ class Observatory(PanBase):
         self.earth_location = site_details['earth_location']
         self.observer = site_details['observer']
 
+        # Sun and moon positions keyed by (jd, body), see `_cached_ephemeris`.
+        self._ephemeris_cache = OrderedDict()
+        # Held while reading or updating the cache, as it is used from several threads.
+        self._ephemeris_lock = threading.Lock()
+
         # Do some one-time calculations
         now = current_time()
-        self._local_sun_pos = self.observer.altaz(now, target=get_sun(now)).alt  # Re-calculated
-        self._local_sunrise = self.observer.sun_rise_time(now)
-        self._local_sunset = self.observer.sun_set_time(now)
-        self._evening_astro_time = self.observer.twilight_evening_astronomical(now, which='next')
-        self._morning_astro_time = self.observer.twilight_morning_astronomical(now, which='next')
+        self._local_sun_pos = self._cached_sun_altaz(now).alt
+
+        # Sun rise/set and twilight times, refreshed by `status` once the morning passes.
+        self._sun_events_lock = threading.Lock()
+        self._local_sunrise = None
+        self._local_sunset = None
+        self._evening_astro_time = None
+        self._morning_astro_time = None
+        self._recompute_sun_events(now)
 
         # Set up some of the hardware.
         self.set_mount(mount)
-        self.cameras: Dict[str, AbstractCamera] = OrderedDict()
+        self.cameras: Dict[str, AbstractCamera] = dict()
         self._primary_camera: Optional[AbstractCamera] = None
 
         if cameras:
@@ -68,11 +95,41 @@ class Observatory(PanBase):
         #  the mount.
         self.set_dome(dome)
 
+        # Dome commands are run one at a time off the caller's thread, see `close_dome`.
+        self._dome_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Dome')
+        self._dome_log_path = Path(self.get_config('dome.operation_log',
+                                                   default=DOME_OPERATION_LOG))
+        if not self._dome_log_path.is_absolute():
+            self._dome_log_path = Path(self.get_config('directories.base',
+                                                       default='.')) / self._dome_log_path
+        # Opened on the first write and kept open, see `_log_dome_operation`.
+        self._dome_log_fd: Optional[int] = None
+        self._dome_log_lock = threading.Lock()
+        if self.dome:
+            self._replay_dome_operations()
+
         self.set_scheduler(scheduler)
         self.current_offset_info = None
 
+        # Threads used to start the exposures on all cameras at once, see `observe`.
+        self._camera_executor = ThreadPoolExecutor(thread_name_prefix='CameraObserve')
+
+        # Config values keyed by config key, see `_cfg`.
+        self._config_cache = dict()
+
         self._image_dir = self.get_config('directories.images')
 
+        # Long-lived workers for pretty images and uploads, see `_submit_post`.
+        self._post_pool: Optional[ProcessPoolExecutor] = None
+        self._create_post_pool()
+
+        # Uploads are queued and sent in batches, see `_upload_loop`.
+        self._upload_queue = queue.Queue()
+        self._upload_thread: Optional[threading.Thread] = None
+
+        # Limits the background plate solves, see `process_observation`.
+        self._solve_slots = threading.BoundedSemaphore(MAX_PENDING_SOLVES)
+
         self.logger.success('Observatory initialized')
 
     ##########################################################################
@@ -97,41 +154,200 @@ class Observatory(PanBase):
         if at_time is None:
             at_time = current_time()
 
-        horizon_deg = self.get_config(f'location.{horizon}_horizon', default=default_dark)
-        is_dark = self.observer.is_night(at_time, horizon=horizon_deg)
+        horizon_deg = self._cfg(f'location.{horizon}_horizon', default_dark)
+        is_dark = bool(self.is_dark_vector(at_time, horizon=horizon_deg))
 
-        self._local_sun_pos = self.observer.altaz(at_time, target=get_sun(at_time)).alt
+        self._local_sun_pos = self._cached_sun_altaz(at_time).alt
         self.logger.debug(f"Sun {self._local_sun_pos:.02f} > {horizon_deg} [{horizon}]")
 
         return is_dark
 
+    def is_dark_vector(self, times, horizon='observe', default_dark=-18 * u.degree):
+        """If sun is below horizon for each of the given times.
+
+        The sun positions for all the times are computed with one astropy call,
+        which is much faster than calling `is_dark` for each time.
+
+        Args:
+            times (`astropy.time.Time`): The times at which to check if dark.
+            horizon (str or `astropy.unit.Quantity`, optional): Which horizon to use,
+                either a name as in `is_dark` or the altitude itself.
+            default_dark (`astropy.unit.Quantity`, optional): The default horizon
+                for when it is considered "dark", see `is_dark`.
+
+        Returns:
+            `numpy.ndarray`: A boolean mask with the same shape as `times`.
+        """
+        if isinstance(horizon, str):
+            horizon = self._cfg(f'location.{horizon}_horizon', default_dark)
+
+        if times.isscalar:
+            sun_altaz = self._cached_sun_altaz(times)
+        else:
+            from astropy.coordinates import get_sun
+            sun_altaz = self.observer.altaz(times, target=get_sun(times))
+
+        return np.asarray(sun_altaz.alt < horizon)
+
+    def _recompute_sun_events(self, now):
+        """Update the sun rise/set and twilight times if they are out of date.
+
+        The times are only recomputed when `now` is past the stored morning
+        twilight, i.e. about once a day.
+
+        Args:
+            now (`astropy.time.Time`): The current time.
+        """
+        with self._sun_events_lock:
+            # Another thread may have already updated them.
+            if self._morning_astro_time is not None and now <= self._morning_astro_time:
+                return
+
+            self.logger.debug(f'Computing sun events for {now}')
+            self._local_sunrise = self.observer.sun_rise_time(now)
+            self._local_sunset = self.observer.sun_set_time(now)
+            self._evening_astro_time = self.observer.twilight_evening_astronomical(now,
+                                                                                   which='next')
+            self._morning_astro_time = self.observer.twilight_morning_astronomical(now,
+                                                                                   which='next')
+
+    def clear_config_cache(self):
+        """Forget the config values remembered by `_cfg`, e.g. after a config change."""
+        self._config_cache.clear()
+
+    def _cfg(self, key, default=None):
+        """Get a config value, reusing it for `CONFIG_CACHE_TTL` seconds.
+
+        Each `get_config` call is a request to the config server, so the values
+        used for every exposure are remembered here instead. Use
+        `clear_config_cache` to pick up a change immediately.
+
+        Note:
+            The `default` is only used when the value is first looked up.
+        """
+        now = time.monotonic()
+        try:
+            expires, value = self._config_cache[key]
+            if now < expires:
+                return value
+        except KeyError:
+            pass
+
+        value = self.get_config(key, default=default)
+        self._config_cache[key] = (now + CONFIG_CACHE_TTL, value)
+
+        return value
+
+    def _cached_ephemeris(self, at_time, body, func):
+        """Look up a solar system computation for `at_time`, computing it if needed.
+
+        The sun and moon positions are expensive to compute and are requested
+        several times for the same time (e.g. in `status`), so results are kept
+        in a small LRU cache keyed by the julian date, rounded to the millisecond,
+        and the `body` name. The value is computed outside of the lock, so two
+        threads may both compute a missing value.
+
+        Args:
+            at_time (`astropy.time.Time`): The time of the computation.
+            body (str): The cache name of the computed value, e.g. 'moon_altaz'.
+            func (callable): Called with `at_time` to compute the value on a miss.
+
+        Returns:
+            The cached or newly computed value.
+        """
+        key = (round(at_time.jd * 86400_000), body)
+        with self._ephemeris_lock:
+            try:
+                self._ephemeris_cache.move_to_end(key)
+                return self._ephemeris_cache[key]
+            except KeyError:
+                pass
+
+        value = func(at_time)
+        with self._ephemeris_lock:
+            self._ephemeris_cache[key] = value
+            while len(self._ephemeris_cache) > EPHEMERIS_CACHE_SIZE:
+                self._ephemeris_cache.popitem(last=False)
+
+        return value
+
+    def _local_sidereal_time(self, at_time):
+        """Apparent local sidereal time at `at_time`, see `sidereal_time`."""
+        longitude = self.earth_location.lon
+        return self._cached_ephemeris(at_time, 'lst',
+                                      lambda t: t.sidereal_time('apparent', longitude=longitude))
+
+    def _hour_angle(self, at_time, target):
+        """Hour angle of `target` (anything with an `ra`) at `at_time`.
+
+        Same as `astroplan.Observer.target_hour_angle` but using the cached
+        sidereal time.
+        """
+        return Longitude(self._local_sidereal_time(at_time) - target.ra)
+
+    def _cached_sun(self, at_time):
+        from astropy.coordinates import get_sun
+        return self._cached_ephemeris(at_time, 'sun', get_sun)
+
+    def _cached_sun_altaz(self, at_time):
+        return self._cached_ephemeris(at_time, 'sun_altaz',
+                                      lambda t: self.observer.altaz(t, self._cached_sun(t)))
+
+    def _cached_moon(self, at_time):
+        from astropy.coordinates import get_moon
+        return self._cached_ephemeris(at_time, 'moon',
+                                      lambda t: get_moon(t, self.observer.location))
+
+    def _cached_moon_altaz(self, at_time):
+        return self._cached_ephemeris(at_time, 'moon_altaz',
+                                      lambda t: self.observer.altaz(t, self._cached_moon(t)))
+
+    def _cached_moon_phase(self, at_time):
+        """Lunar phase angle, same as `astroplan.moon_phase_angle` but with cached bodies."""
+
+        def _moon_phase(t):
+            sun = self._cached_sun(t)
+            moon = self._cached_moon(t)
+            elongation = sun.separation(moon)
+            return np.arctan2(sun.distance * np.sin(elongation),
+                              moon.distance - sun.distance * np.cos(elongation))
+
+        return self._cached_ephemeris(at_time, 'moon_phase', _moon_phase)
+
+    def _cached_moon_illumination(self, at_time):
+        """Fraction of the moon illuminated, see `astroplan.moon_illumination`."""
+        return self._cached_ephemeris(
+            at_time, 'moon_illumination',
+            lambda t: ((1 + np.cos(self._cached_moon_phase(t))) / 2.0).value)
+
     ##########################################################################
     # Properties
     ##########################################################################
 
     @property
     def sidereal_time(self):
-        return self.observer.local_sidereal_time(current_time())
+        return self._local_sidereal_time(current_time())
 
     @property
     def has_cameras(self):
         return len(self.cameras) > 0
 
     @property
-    def primary_camera(self) -> panoptes.pocs.camera.camera.AbstractCamera:
+    def primary_camera(self) -> AbstractCamera:
         """Return primary camera.
 
         Note:
             If no camera has been marked as primary this will return the first
-            camera in the OrderedDict as primary.
+            camera added as primary.
 
         Returns:
             `pocs.camera.Camera`: The primary camera.
         """
-        if not self._primary_camera and self.has_cameras:
-            return self.cameras[list(self.cameras.keys())[0]]
-        else:
-            return self._primary_camera
+        if self._primary_camera is None and self.has_cameras:
+            # Remember the first camera, this is reset by `add_camera` and `remove_camera`.
+            self._primary_camera = next(iter(self.cameras.values()))
+
+        return self._primary_camera
 
     @primary_camera.setter
     def primary_camera(self, cam):
@@ -197,11 +413,15 @@ class Observatory(PanBase):
             cam_name (str): The name to use for the camera, e.g. `Cam00`.
             camera (`pocs.camera.camera.Camera`): An instance of the `~Camera` class.
         """
-        assert isinstance(camera, AbstractCamera)
+        if not hasattr(camera, 'take_observation'):
+            raise TypeError(f'Camera is not an instance of {AbstractCamera} class')
+
         self.logger.debug(f'Adding {cam_name}: {camera}')
         if cam_name in self.cameras:
             self.logger.debug(
                 f'{cam_name} already exists, replacing existing camera under that name.')
+            if self._primary_camera is self.cameras[cam_name]:
+                self._primary_camera = None
 
         self.cameras[cam_name] = camera
         if camera.is_primary:
@@ -220,6 +440,8 @@ class Observatory(PanBase):
             cam_name (str): Name of camera to remove.
         """
         self.logger.debug(f'Removing {cam_name}')
+        if self._primary_camera is self.cameras[cam_name]:
+            self._primary_camera = None
         del self.cameras[cam_name]
 
     def set_scheduler(self, scheduler):
@@ -227,27 +449,33 @@ class Observatory(PanBase):
         Args:
             scheduler (`pocs.scheduler.BaseScheduler`): An instance of the `~BaseScheduler` class.
         """
-        self._set_hardware(scheduler, 'scheduler', BaseScheduler)
+        self._set_hardware(scheduler, 'scheduler', BaseScheduler,
+                           ('get_observation', 'clear_available_observations'))
 
     def set_dome(self, dome):
         """Set's dome or remove the dome for the `Observatory`.
         Args:
             dome (`pocs.dome.AbstractDome`): An instance of the `~AbstractDome` class.
         """
-        self._set_hardware(dome, 'dome', AbstractDome)
+        self._set_hardware(dome, 'dome', AbstractDome, ('connect', 'disconnect', 'open', 'close'))
 
     def set_mount(self, mount):
         """Sets the mount for the `Observatory`.
         Args:
             mount (`pocs.mount.AbstractMount`): An instance of the `~AbstractMount` class.
         """
-        self._set_hardware(mount, 'mount', AbstractMount)
+        self._set_hardware(mount, 'mount', AbstractMount,
+                           ('initialize', 'disconnect', 'get_current_coordinates',
+                            'correct_tracking'))
 
-    def _set_hardware(self, new_hardware, hw_type, hw_class):
+    def _set_hardware(self, new_hardware, hw_type, hw_class, required_methods):
         # Lookup the set method for the hardware type.
         hw_attr = getattr(self, hw_type)
 
-        if isinstance(new_hardware, hw_class):
+        # Check for the methods the observatory uses rather than the (slower)
+        # isinstance check against the abstract base class.
+        if new_hardware is not None and all(hasattr(new_hardware, method)
+                                            for method in required_methods):
             self.logger.success(f'Adding {new_hardware}')
             setattr(self, hw_type, new_hardware)
         elif new_hardware is None:
@@ -275,24 +503,55 @@ class Observatory(PanBase):
         if self.mount:
             self.mount.disconnect()
         if self.dome:
-            self.dome.disconnect()
+            # Disconnect after any dome command that is still running.
+            self._dome_executor.submit(self.dome.disconnect).result()
+        # Stop the dome and camera threads. The executors are replaced so the observatory
+        # can still be used, their threads are only started when something is submitted.
+        self._dome_executor.shutdown(wait=True)
+        self._dome_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='Dome')
+        self._camera_executor.shutdown(wait=True)
+        self._camera_executor = ThreadPoolExecutor(thread_name_prefix='CameraObserve')
+        with self._dome_log_lock:
+            if self._dome_log_fd is not None:
+                os.close(self._dome_log_fd)
+                self._dome_log_fd = None
+        if self._upload_thread is not None:
+            self._upload_queue.put(None)
+            self._upload_thread.join()
+            self._upload_thread = None
+        if self._post_pool is not None:
+            self.logger.debug('Waiting for image post-processing to finish')
+            self._post_pool.shutdown(wait=True)
+            self._post_pool = None
 
     @property
     def status(self):
         """Get status information for various parts of the observatory."""
+        return self.get_status()
+
+    def get_status(self, now=None):
+        """Get status information for various parts of the observatory.
+
+        Args:
+            now (`astropy.time.Time`, optional): The time to use for all the time
+                dependent values, default None for `current_time()`.
+
+        Returns:
+            dict: The status of the observatory, see `status`.
+        """
         status = {'can_observe': self.can_observe}
 
-        now = current_time()
+        if now is None:
+            now = current_time()
 
         try:
             if self.mount and self.mount.is_initialized:
                 status['mount'] = self.mount.status
                 current_coords = self.mount.get_current_coordinates()
-                status['mount']['current_ha'] = self.observer.target_hour_angle(now, current_coords)
+                status['mount']['current_ha'] = self._hour_angle(now, current_coords)
                 if self.mount.has_target:
                     target_coords = self.mount.get_target_coordinates()
-                    target_ha = self.observer.target_hour_angle(now, target_coords)
-                    status['mount']['mount_target_ha'] = target_ha
+                    status['mount']['mount_target_ha'] = self._hour_angle(now, target_coords)
         except Exception as e:  # pragma: no cover
             self.logger.warning(f"Can't get mount status: {e!r}")
 
@@ -306,13 +565,16 @@ class Observatory(PanBase):
             if self.current_observation:
                 status['observation'] = self.current_observation.status
                 field = self.current_observation.field
-                status['observation']['field_ha'] = self.observer.target_hour_angle(now, field)
+                status['observation']['field_ha'] = self._hour_angle(now, field.coord)
         except Exception as e:  # pragma: no cover
             self.logger.warning(f"Can't get observation status: {e!r}")
 
         try:
+            if now > self._morning_astro_time:
+                self._recompute_sun_events(now)
+
             status['observer'] = {
-                'siderealtime': str(self.sidereal_time),
+                'siderealtime': str(self._local_sidereal_time(now)),
                 'utctime': now,
                 'localtime': datetime.now(),
                 'local_evening_astro_time': self._evening_astro_time,
@@ -320,9 +582,9 @@ class Observatory(PanBase):
                 'local_sun_set_time': self._local_sunset,
                 'local_sun_rise_time': self._local_sunrise,
                 'local_sun_position': self._local_sun_pos,
-                'local_moon_alt': self.observer.moon_altaz(now).alt,
-                'local_moon_illumination': self.observer.moon_illumination(now),
-                'local_moon_phase': self.observer.moon_phase(now),
+                'local_moon_alt': self._cached_moon_altaz(now).alt,
+                'local_moon_illumination': self._cached_moon_illumination(now),
+                'local_moon_phase': self._cached_moon_phase(now),
             }
 
         except Exception as e:  # pragma: no cover
@@ -375,36 +637,45 @@ class Observatory(PanBase):
 
         """
         # Get observatory metadata
-        headers = self.get_standard_headers()
+        now = current_time()
+        headers = self.get_standard_headers(now=now)
 
         # All cameras share a similar start time
-        headers['start_time'] = current_time(flatten=True)
+        headers['start_time'] = flatten_time(now)
 
-        # Take exposure with each camera.
-        for cam_name, camera in self.cameras.items():
+        def _take_observation(cam_name, camera):
             self.logger.debug(f"Exposing for camera: {cam_name}")
-            camera.take_observation(self.current_observation, headers=headers)
+            # Record when each camera was actually triggered.
+            cam_headers = dict(headers, trigger_time=current_time(flatten=True))
+            return camera.take_observation(self.current_observation, headers=cam_headers)
+
+        # Use the same cameras for starting and waiting on the exposures.
+        cameras = tuple(self.cameras.items())
+
+        # Take exposure with each camera, starting them all at the same time.
+        submit = self._camera_executor.submit
+        futures = [submit(_take_observation, cam_name, camera) for cam_name, camera in cameras]
+        # Starting an exposure doesn't wait for it, so allow each camera its own timeout.
+        start_timeout = max((camera.timeout for _, camera in cameras), default=0)
+        done, not_done = wait_futures(futures, timeout=start_timeout)
+        if not_done:
+            raise error.Timeout(f'Timeout while starting exposures on {len(not_done)} cameras')
+        for future in futures:
+            # Raise any error from the cameras.
+            future.result()
 
         if blocking:
             cam = self.primary_camera
             exptime = self.current_observation.exptime.value
-            readout_time = cam.readout_time
-            timeout = exptime + readout_time + cam.timeout
-
-            timer = CountdownTimer(timeout, name='Observe')
-            # Sleep for the exposure time to start.
-            timer.sleep(max_sleep=exptime + readout_time)
-            # Then start checking for complete exposures.
-            while timer.expired() is False:
-                done_observing = [cam.is_observing is False for cam in self.cameras.values()]
-                if all(done_observing):
-                    self.logger.info('Finished observing for all cameras')
-                    break
+            timeout = exptime + cam.readout_time + cam.timeout
 
-                timer.sleep(max_sleep=readout_time)
+            # Wait for each camera to signal it is done, sharing one deadline.
+            time_left = CountdownTimer(timeout, name='Observe').time_left
+            for cam_name, camera in cameras:
+                if not camera.wait_for_observation(timeout=time_left()):
+                    raise TimeoutError(f'Timer expired waiting for {cam_name} to finish observing')
 
-            if timer.expired():
-                raise TimeoutError(f'Timer expired waiting for cameras to finish observing')
+            self.logger.info('Finished observing for all cameras')
 
     def process_observation(self,
                             compress_fits: Optional[bool] = None,
@@ -412,6 +683,7 @@ class Observatory(PanBase):
                             make_pretty_images: Optional[bool] = None,
                             plate_solve: Optional[bool] = None,
                             upload_image_immediately: Optional[bool] = None,
+                            exposures: Optional[Dict[str, Exposure]] = None,
                             ):
         """Process an individual observation.
 
@@ -427,9 +699,27 @@ class Observatory(PanBase):
             plate_solve (bool or None): If images should be plate solved, default None for config.
             upload_image_immediately (bool or None): If images should be uploaded (in a separate
                 process).
+            exposures (dict or None): The exposure to process for each camera, keyed by
+                camera name. If None (default), the latest exposure of each camera in the
+                current observation. Pass these when processing in the background, as the
+                next exposure may be added to the observation first.
         """
-        for cam_name in self.cameras.keys():
-            exposure = self.current_observation.exposure_list[cam_name][-1]
+        if exposures is None:
+            exposures = {cam_name: self.current_observation.exposure_list[cam_name][-1]
+                         for cam_name in self.cameras.keys()}
+
+        # Resolve the processing options once for all the cameras.
+        options = dict(compress_fits=compress_fits,
+                       record_observations=record_observations,
+                       make_pretty_images=make_pretty_images,
+                       plate_solve=plate_solve,
+                       upload_image_immediately=upload_image_immediately)
+        flags = {name: value or self._cfg(f'observations.{name}', False)
+                 for name, value in options.items()}
+
+        # Start solving and compressing for all the cameras before waiting on any of them.
+        pending = list()
+        for exposure in exposures.values():
             self.logger.debug(f'Processing observation with {exposure=!r}')
             metadata = exposure.metadata
             try:
@@ -440,62 +730,136 @@ class Observatory(PanBase):
             except KeyError as e:
                 raise error.PanError(f'No information in image metadata, unable to process:  {e!r}')
 
-            field_name = metadata.get('field_name', '')
-
             if metadata.get('status') == 'complete':
                 self.logger.debug(f'{image_id} has already been processed, skipping')
-                return
+                continue
 
-            if plate_solve or self.get_config('observations.plate_solve', default=False):
+            if flags['plate_solve']:
                 self.logger.debug(f'Plate solving {file_path=}')
+                # Wait for a slot so a backlog of solves can't pile up in the pool.
+                self._solve_slots.acquire()
+                try:
+                    exposure.solve_future = self._submit_post(f'PlateSolve-{image_id}',
+                                                              fits_utils.get_solve_field,
+                                                              file_path)
+                except Exception:
+                    self._solve_slots.release()
+                    raise
+                exposure.solve_future.add_done_callback(lambda _: self._solve_slots.release())
+
+            if flags['compress_fits']:
+                self.logger.debug(f'Compressing {file_path=!r}')
+                if exposure.solve_future is None:
+                    exposure.fpack_future = self._submit_post(f'Fpack-{image_id}',
+                                                              fits_utils.fpack,
+                                                              file_path)
+                else:
+                    # The solve writes the WCS to the file so compress it afterwards.
+                    exposure.fpack_future = self._compress_after_solve(exposure.solve_future,
+                                                                       image_id, file_path)
+
+            pending.append((exposure, metadata, file_path, image_id, seq_id, exptime))
+
+        for exposure, metadata, file_path, image_id, seq_id, exptime in pending:
+            metadata_get = metadata.get
+            field_name = metadata_get('field_name', '')
+            is_primary = metadata_get('is_primary', False)
+
+            if exposure.solve_future is not None:
                 try:
-                    metadata = fits_utils.get_solve_field(file_path)
+                    metadata = exposure.solve_future.result()
                     file_path = metadata['solved_fits_file']
                     self.logger.debug(f'Solved {file_path}, replacing metadata.')
                 except Exception as e:
                     self.logger.warning(f'Problem solving {file_path=}: {e!r}')
 
-            if compress_fits or self.get_config('observations.compress_fits', default=False):
-                self.logger.debug(f'Compressing {file_path=!r}')
-                compressed_file_path = fits_utils.fpack(file_path)
-                exposure.path = Path(compressed_file_path)
-                metadata['filepath'] = compressed_file_path
-                self.logger.debug(f'Compressed {compressed_file_path}')
+            if exposure.fpack_future is not None:
+                try:
+                    file_path = str(self._wait_for_compression(exposure))
+                    metadata['filepath'] = file_path
+                    self.logger.debug(f'Compressed {file_path}')
+                except Exception as e:
+                    self.logger.warning(f'Problem compressing {file_path=!r}: {e!r}')
 
-            if record_observations or self.get_config('observations.record_observations',
-                                                      default=False):
+            if flags['record_observations']:
                 self.logger.debug(f"Adding current observation to db: {image_id}")
                 metadata['status'] = 'complete'
                 self.db.insert_current('observations', metadata)
 
-            if make_pretty_images or self.get_config('observations.make_pretty_images',
-                                                     default=False):
+            if flags['make_pretty_images']:
                 try:
                     image_title = f'{field_name} [{exptime}s] {seq_id}'
 
                     self.logger.debug(f"Making pretty image for {file_path=!r}")
                     link_path = None
-                    if metadata['is_primary']:
+                    if is_primary:
                         # TODO This should be in the config somewhere.
-                        link_path = Path(self.get_config('directories.images')) / 'latest.jpg'
-
-                    pretty_process = Process(name=f'PrettyImageProcess-{image_id}',
-                                             target=img_utils.make_pretty_image,
-                                             args=(file_path,),
-                                             kwargs=dict(title=image_title,
-                                                         link_path=str(link_path)))
-                    pretty_process.start()
+                        link_path = Path(self._image_dir) / 'latest.jpg'
+
+                    self._submit_post(f'PrettyImage-{image_id}',
+                                      img_utils.make_pretty_image,
+                                      file_path,
+                                      title=image_title,
+                                      link_path=str(link_path))
                 except Exception as e:  # pragma: no cover
                     self.logger.warning(f'Problem with extracting pretty image: {e!r}')
 
-            if upload_image_immediately or self.get_config('observations.upload_image_immediately',
-                                                           default=False):
+            if flags['upload_image_immediately']:
                 self.logger.debug(f"Uploading current observation: {image_id}")
                 try:
                     self.upload_exposure(exposure_info=exposure)
                 except Exception as e:
                     self.logger.warning(f'Problem uploading exposure: {e!r}')
 
+    def _compress_after_solve(self, solve_future, image_id, file_path):
+        """Compress the file once its plate solve is done, successful or not.
+
+        The fpack is submitted from a callback on the solve, so no thread is
+        held waiting for the solve.
+
+        Returns:
+            `concurrent.futures.Future`: The future for the compressed file path.
+        """
+        fpack_future = Future()
+
+        def _copy_result(post_future):
+            try:
+                fpack_future.set_result(post_future.result())
+            except Exception as e:
+                fpack_future.set_exception(e)
+
+        def _submit_fpack(_):
+            try:
+                post_future = self._submit_post(f'Fpack-{image_id}', fits_utils.fpack, file_path)
+            except Exception as e:
+                fpack_future.set_exception(e)
+            else:
+                post_future.add_done_callback(_copy_result)
+
+        solve_future.add_done_callback(_submit_fpack)
+
+        return fpack_future
+
+    def _wait_for_compression(self, exposure, timeout=None):
+        """Wait for the background fpack of an exposure and update its path.
+
+        Args:
+            exposure (`Exposure`): The exposure, possibly with an `fpack_future`.
+            timeout (float or None): How long to wait for the compression, default None
+                to wait until it is done.
+
+        Returns:
+            `pathlib.Path`: The path of the (compressed) exposure file.
+        """
+        fpack_future = exposure.fpack_future
+        if fpack_future is not None:
+            compressed_file_path = fpack_future.result(timeout=timeout)
+            exposure.path = Path(compressed_file_path)
+            exposure.metadata['filepath'] = compressed_file_path
+            exposure.fpack_future = None
+
+        return exposure.path
+
     def analyze_recent(self):
         """Analyze the most recent exposure
 
@@ -513,11 +877,23 @@ class Observatory(PanBase):
 
         try:
             # Get the image to compare
-            image_id, image_path = self.current_observation.last_exposure
+            exposure = self.current_observation.exposure_list[self.primary_camera.name][-1]
+            image_id = exposure.image_id
 
+            # Use the plate solve from `process_observation` if there is one.
+            solve_info = None
+            if exposure.solve_future is not None:
+                try:
+                    solve_info = exposure.solve_future.result(timeout=PLATE_SOLVE_WAIT)
+                except Exception as e:
+                    self.logger.warning(f'Background solve for {image_id} failed: {e!r}')
+            image_path = self._wait_for_compression(exposure, timeout=PLATE_SOLVE_WAIT)
+
+            from panoptes.pocs.images import Image
             current_image = Image(image_path, location=self.earth_location)
 
-            solve_info = current_image.solve_field(skip_solved=False)
+            if solve_info is None or current_image.wcs is None:
+                solve_info = current_image.solve_field(skip_solved=False)
 
             self.logger.debug(f"Solve Info: {solve_info}")
 
@@ -542,28 +918,99 @@ class Observatory(PanBase):
         return self.current_offset_info
 
     def upload_exposure(self, exposure_info, bucket_name=None):
-        """Uploads the most recent image from the current observation."""
-        bucket_name = bucket_name or self.get_config('panoptes_network.buckets.upload')
+        """Queue the given exposure to be uploaded.
 
-        image_path = exposure_info.path
-        if not image_path.exists():
-            raise FileNotFoundError(f'File does not exist: {str(image_path)}')
+        Uploads are sent in batches in the background so that the exposures from
+        all the cameras are uploaded together, see `_upload_loop`.
+        """
+        bucket_name = bucket_name or self._cfg('panoptes_network.buckets.upload')
 
+        # A missing file is skipped by the uploader rather than checked here.
+        image_path = self._wait_for_compression(exposure_info)
         self.logger.debug(f'Preparing {image_path} for upload')
 
         # Remove the local images directory for the upload name and replace with PAN_ID.
-        bucket_path = str(image_path.absolute()).replace(self.get_config('directories.images'),
-                                                         self.get_config('pan_id'))
+        bucket_path = image_path.absolute().as_posix().replace(self._image_dir,
+                                                               self._cfg('pan_id'), 1)
+
+        self.logger.info(f'Queueing {str(image_path)} for upload to {bucket_path} on {bucket_name}')
+        self._upload_queue.put_nowait((image_path, bucket_path, bucket_name))
+
+        if self._upload_thread is None or not self._upload_thread.is_alive():
+            self._upload_thread = threading.Thread(target=self._upload_loop,
+                                                   name='ImageUploader',
+                                                   daemon=True)
+            self._upload_thread.start()
+
+    def _upload_loop(self):
+        """Send the queued uploads to the post-processing pool in batches.
+
+        Waits `UPLOAD_BATCH_WAIT` seconds after each queued exposure for more to
+        arrive and then uploads everything for a bucket with one `upload_images`
+        call. A `None` on the queue stops the loop after any pending uploads.
+        """
+        # Imported here so the storage client is only loaded when uploading.
+        from panoptes.pocs.utils.cli.image import upload_images
+
+        running = True
+        while running:
+            item = self._upload_queue.get()
+            if item is None:
+                break
+
+            batch = defaultdict(list)
+            while item is not None:
+                image_path, bucket_path, bucket_name = item
+                batch[bucket_name].append((image_path, bucket_path))
+                try:
+                    item = self._upload_queue.get(timeout=UPLOAD_BATCH_WAIT)
+                except queue.Empty:
+                    break
+            else:
+                running = False
+
+            for bucket_name, uploads in batch.items():
+                self.logger.debug(f'Uploading {len(uploads)} files to {bucket_name}')
+                self._submit_post(f'ImageUploader-{bucket_name}',
+                                  upload_images,
+                                  uploads,
+                                  bucket_name=bucket_name)
+
+    def _create_post_pool(self):
+        """Create the process pool used for image post-processing.
 
-        # Create a separate process for the upload.
-        upload_process = Process(name=f'ImageUploaderProcess-{exposure_info.image_id}',
-                                 target=upload_image,
-                                 kwargs=dict(file_path=image_path,
-                                             bucket_path=bucket_path,
-                                             bucket_name=bucket_name))
+        The workers are started from a `forkserver` so they don't each copy the
+        (large) parent process, and they are reused for all exposures rather
+        than starting a new process per image.
+        """
+        max_workers = self.get_config('observations.post_processing_workers', default=2)
+        try:
+            mp_context = multiprocessing.get_context('forkserver')
+        except ValueError:  # pragma: no cover
+            mp_context = None
+
+        self._post_pool = ProcessPoolExecutor(max_workers=max_workers, mp_context=mp_context)
 
-        self.logger.info(f'Uploading {str(image_path)} to {bucket_path} on {bucket_name}')
-        upload_process.start()
+    def _submit_post(self, name, func, *args, **kwargs):
+        """Run `func` in the post-processing pool, logging any problems it has.
+
+        Returns:
+            `concurrent.futures.Future`: The future for the submitted call.
+        """
+        if self._post_pool is None:
+            self._create_post_pool()
+
+        def _log_result(future):
+            try:
+                future.result()
+                self.logger.debug(f'{name} finished')
+            except Exception as e:
+                self.logger.warning(f'Problem running {name}: {e!r}')
+
+        future = self._post_pool.submit(func, *args, **kwargs)
+        future.add_done_callback(_log_result)
+
+        return future
 
     def update_tracking(self, **kwargs):
         """Update tracking with rate adjustment.
@@ -613,13 +1060,15 @@ class Observatory(PanBase):
             except error.Timeout:
                 self.logger.warning("Timeout while correcting tracking")
 
-    def get_standard_headers(self, observation=None):
+    def get_standard_headers(self, observation=None, now=None):
         """Get a set of standard headers
 
         Args:
             observation (`~pocs.scheduler.observation.Observation`, optional): The
                 observation to use for header values. If None is given, use
                 the `current_observation`.
+            now (`astropy.time.Time`, optional): The time to use for the header
+                values, default None for `current_time()`.
 
         Returns:
             dict: The standard headers
@@ -635,19 +1084,24 @@ class Observatory(PanBase):
 
         self.logger.debug("Getting headers for : {}".format(observation))
 
-        t0 = current_time()
-        moon = get_moon(t0, self.observer.location)
+        t0 = current_time() if now is None else now
+        moon = self._cached_moon(t0)
+
+        # Build the AltAz frame once and compute the hour angle directly
+        # rather than going through the astroplan wrappers for each value.
+        field_altaz = field.coord.transform_to(self.observer.altaz(t0))
+        field_ha = self._hour_angle(t0, field.coord)
 
         headers = {
-            'airmass': self.observer.altaz(t0, field).secz.value,
+            'airmass': field_altaz.secz.value,
             'creator': "POCSv{}".format(self.__version__),
             'elevation': self.location.get('elevation').value,
-            'ha_mnt': self.observer.target_hour_angle(t0, field).value,
+            'ha_mnt': field_ha.value,
             'latitude': self.location.get('latitude').value,
             'longitude': self.location.get('longitude').value,
-            'moon_fraction': self.observer.moon_illumination(t0),
+            'moon_fraction': self._cached_moon_illumination(t0),
             'moon_separation': field.coord.separation(moon).value,
-            'observer': self.get_config('name', default=''),
+            'observer': self._cfg('name', ''),
             'origin': 'Project PANOPTES',
             'tracking_rate_ra': self.mount.tracking_rate,
         }
@@ -713,30 +1167,130 @@ class Observatory(PanBase):
 
         return autofocus_events
 
+    def _connect_dome(self):
+        """Connect to the dome unless it is already connected.
+
+        The drivers keep track of their connection, so checking it first avoids
+        another handshake with the dome controller on every open or close.
+
+        Returns:
+            bool: True if the dome is connected.
+        """
+        return self.dome.is_connected or self.dome.connect()
+
     def open_dome(self):
         """Open the dome, if there is one.
 
+        Waits for any dome command that is still running, e.g. a close.
+
         Returns: False if there is a problem opening the dome,
                  else True if open (or if not exists).
         """
         if not self.dome:
             return True
-        if not self.dome.connect():
-            return False
-        if not self.dome.is_open:
-            self.logger.info('Opening dome')
-        return self.dome.open()
+        return self._dome_executor.submit(self._do_open_dome).result()
 
-    def close_dome(self):
+    def close_dome(self, blocking=True):
         """Close the dome, if there is one.
 
+        If the dome is open, the close is written to the dome operation log before
+        it is sent to the dome and the log is emptied once the dome is closed, so
+        that a close that was interrupted is sent again when the observatory
+        starts, see `_replay_dome_operations`.
+
+        Args:
+            blocking (bool): If True (the default), wait for the dome to close,
+                otherwise return a future for the close.
+
         Returns: False if there is a problem closing the dome,
-                 else True if closed (or if not exists).
+                 else True if closed (or if not exists). If not blocking, a
+                 `concurrent.futures.Future` with the result.
         """
         if not self.dome:
             return True
-        if not self.dome.connect():
+
+        future = self._dome_executor.submit(self._do_close_dome)
+        if blocking:
+            return future.result()
+
+        return future
+
+    def _do_open_dome(self):
+        if not self._connect_dome():
+            return False
+        if not self.dome.get_status()['is_open']:
+            self.logger.info('Opening dome')
+        return self.dome.open()
+
+    def _do_close_dome(self):
+        if not self._connect_dome():
             return False
-        if not self.dome.is_closed:
-            self.logger.info('Closed dome')
-        return self.dome.close()
+        if self.dome.get_status()['is_closed']:
+            return True
+
+        self._log_dome_operation('close_dome')
+        self.logger.info('Closed dome')
+        closed = self.dome.close()
+
+        if closed:
+            self._clear_dome_operations()
+
+        return closed
+
+    def _open_dome_log(self):
+        """Open the dome operation log for appending, if needed. Call with the lock held."""
+        if self._dome_log_fd is None:
+            self._dome_log_path.parent.mkdir(parents=True, exist_ok=True)
+            self._dome_log_fd = os.open(self._dome_log_path,
+                                        os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+
+        return self._dome_log_fd
+
+    def _log_dome_operation(self, op):
+        """Append an operation to the dome operation log.
+
+        The file is synced to disk so the entry survives a crash or power loss.
+        """
+        record = json.dumps(dict(op=op, ts=time.time()))
+        try:
+            with self._dome_log_lock:
+                # One write of the whole line and one sync, without the file object.
+                dome_log_fd = self._open_dome_log()
+                os.write(dome_log_fd, f'{record}\n'.encode())
+                os.fsync(dome_log_fd)
+        except OSError as e:
+            self.logger.warning(f'Could not write to the dome operation log: {e!r}')
+
+    def _clear_dome_operations(self):
+        """Empty the dome operation log once there is nothing left to replay.
+
+        This isn't synced, as a close left in the log after a crash is only
+        sent to a dome that is already closed.
+        """
+        try:
+            with self._dome_log_lock:
+                os.ftruncate(self._open_dome_log(), 0)
+        except OSError as e:
+            self.logger.warning(f'Could not clear the dome operation log: {e!r}')
+
+    def _replay_dome_operations(self):
+        """Send a dome close again if the last one in the operation log was not done."""
+        try:
+            with self._dome_log_path.open() as f:
+                lines = f.read().splitlines()
+            last_op = json.loads(lines[-1]) if lines else dict()
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.logger.warning(f'Could not read the dome operation log: {e!r}')
+            return
+
+        if last_op.get('op') == 'close_dome':
+            self.logger.warning('Last dome close was not completed, closing dome')
+
+            def _clear_if_closed(future):
+                # A dome that is already closed doesn't clear the log itself.
+                if future.exception() is None and future.result():
+                    self._clear_dome_operations()
+
+            self.close_dome(blocking=False).add_done_callback(_clear_if_closed)
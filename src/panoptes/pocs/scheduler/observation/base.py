@@ -2,7 +2,7 @@ import os
 from collections import OrderedDict, defaultdict
 from contextlib import suppress
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional
 
 from astropy import units as u
 from panoptes.utils.library import load_module
@@ -20,6 +20,8 @@ class Exposure:
     path: Path
     metadata: dict
     is_primary: bool = False
+    fpack_future: Optional[Any] = None
+    solve_future: Optional[Any] = None
 
 
 class Observation(PanBase):
@@ -1,4 +1,4 @@
-from multiprocessing import Process
+from threading import Thread
 
 from panoptes.utils import error
 
@@ -19,10 +19,16 @@ def on_enter(event_data):
             pocs.observatory.observe(blocking=True)
             pocs.say(f"Finished observing! I'll start processing that in the background.")
 
-            # Do processing in background.
-            process_proc = Process(target=pocs.observatory.process_observation)
-            process_proc.start()
-            pocs.logger.debug(f'Processing for {current_obs} started on {process_proc.pid=}')
+            # Do processing in background. The heavy lifting is done by the
+            # observatory's worker pool so a thread is enough here. The exposures
+            # are passed in as the next `observe` adds to the exposure list.
+            exposures = {cam_name: current_obs.exposure_list[cam_name][-1]
+                         for cam_name in pocs.observatory.cameras.keys()}
+            process_thread = Thread(target=pocs.observatory.process_observation,
+                                    kwargs=dict(exposures=exposures),
+                                    name=f'ProcessObservation-{current_obs.seq_time}')
+            process_thread.start()
+            pocs.logger.debug(f'Processing for {current_obs} started on {process_thread.name=}')
     except (error.Timeout, error.CameraNotFound):
         pocs.logger.warning("Timeout waiting for images. Something wrong with cameras, parking.")
     except Exception as e:
@@ -1,5 +1,6 @@
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import List, Sequence, Tuple
 
 import typer
 
@@ -27,6 +28,43 @@ def upload_image(file_path: Path, bucket_path: str,
     return blob.public_url
 
 
+def upload_images(uploads: Sequence[Tuple[Path, str]],
+                  bucket_name: str = 'panoptes-images-incoming',
+                  timeout: float = 180.,
+                  max_workers: int = 4,
+                  storage_client=None) -> List[str]:
+    """Uploads a batch of images concurrently with a single storage client.
+
+    Args:
+        uploads: A sequence of `(file_path, bucket_path)` pairs.
+        bucket_name: The bucket to upload to.
+        timeout: The timeout in seconds for each upload.
+        max_workers: The max number of uploads in flight at once.
+        storage_client: The storage client to use, created if not given.
+
+    Returns:
+        The public urls of the uploaded files, in the order given. Files that
+        no longer exist are skipped.
+    """
+    storage_client: storage.Client = storage_client or storage.Client()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(upload_image, file_path, bucket_path,
+                                   bucket_name=bucket_name,
+                                   timeout=timeout,
+                                   storage_client=storage_client)
+                   for file_path, bucket_path in uploads]
+
+    public_urls = list()
+    for (file_path, _), future in zip(uploads, futures):
+        try:
+            public_urls.append(future.result())
+        except FileNotFoundError:
+            typer.secho(f'File does not exist, skipping upload: {file_path}')
+
+    return public_urls
+
+
 @upload_app.command('directory')
 def upload_directory(directory_path: Path,
                      exclude: str,
@@ -1,29 +1,61 @@
+import importlib
+from contextvars import ContextVar
+from dataclasses import dataclass
+from functools import lru_cache
+
 import typer
+from typer.core import TyperGroup
+
+# The sub-apps are only imported when their command is used, see `LazyGroup`.
+_SUBAPPS = {
+    'config': ('panoptes.pocs.utils.cli.config', 'Interact with the config server.'),
+    'sensor': ('panoptes.pocs.utils.cli.sensor', 'Interact with system sensors.'),
+    'image': ('panoptes.pocs.utils.cli.image', 'Interact with images.'),
+}
+
+
+@lru_cache(maxsize=None)
+def _load_subapp(name):
+    """Import the sub-app module and build its click command."""
+    module_name, help_text = _SUBAPPS[name]
+    command = typer.main.get_group(importlib.import_module(module_name).app)
+    command.name = name
+    command.help = help_text
+    return command
+
+
+class LazyGroup(TyperGroup):
+    """A group that adds the sub-apps as they are looked up."""
+
+    def list_commands(self, ctx):
+        return sorted(set(super().list_commands(ctx)) | set(_SUBAPPS))
+
+    def get_command(self, ctx, cmd_name):
+        if cmd_name in _SUBAPPS and cmd_name not in self.commands:
+            self.add_command(_load_subapp(cmd_name), cmd_name)
+        return super().get_command(ctx, cmd_name)
+
 
-from panoptes.pocs.utils.cli import config
-from panoptes.pocs.utils.cli import sensor
-from panoptes.pocs.utils.cli import image
+@dataclass(frozen=True)
+class CLIState:
+    """The options given to the main command."""
+    config_host: str = '127.0.0.1'
+    config_port: int = 6563
+    verbose: bool = False
 
-app = typer.Typer()
-state = {'verbose': False}
 
-app.add_typer(config.app, name="config", help='Interact with the config server.')
-app.add_typer(sensor.app, name="sensor", help='Interact with system sensors.')
-app.add_typer(image.app, name="image", help='Interact with images.')
+app = typer.Typer(cls=LazyGroup)
+state: ContextVar[CLIState] = ContextVar('state', default=CLIState())
 
 
 @app.callback()
-def main(context: typer.Context,
-         config_host: str = '127.0.0.1',
+def main(config_host: str = '127.0.0.1',
          config_port: int = 6563,
          verbose: bool = False):
-    state.update({
-        'config_host': config_host,
-        'config_port': config_port,
-        'verbose': verbose,
-    })
+    cli_state = CLIState(config_host=config_host, config_port=config_port, verbose=verbose)
+    state.set(cli_state)
     if verbose:
-        typer.echo(f'Command options from main: {context.params!r}')
+        typer.echo(f'Command options from main: {cli_state!r}')
 
 
 if __name__ == "__main__":
@@ -13,9 +13,9 @@ logger = get_logger(stderr_log_level='ERROR')
 
 @app.callback()
 def main(context: typer.Context):
-    context.params.update(context.parent.params)
-    verbose = context.params['verbose']
-    if verbose:
+    # Only the verbose flag is used, so only copy the options when showing them.
+    if context.parent.params['verbose']:
+        context.params.update(context.parent.params)
         typer.echo(f'Command options from power: {context.params!r}')
 
 
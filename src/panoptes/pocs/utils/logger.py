@@ -84,6 +84,7 @@ def get_logger(console_log_file='panoptes.log',
         stderr_id = loguru_logger.add(
             sys.stdout,
             format=stderr_format,
+            enqueue=True,  # Don't block the caller on the terminal.
             level=stderr_log_level
         )
         LOGGER_INFO.handlers['stderr'] = stderr_id
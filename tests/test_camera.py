@@ -517,9 +517,8 @@ def test_observation(camera, images_dir):
     observation = Observation(field, exptime=1.5 * u.second)
     observation.seq_time = '19991231T235959'
     camera.take_observation(observation)
-    while camera.is_observing:
-        camera.logger.trace(f'Waiting for observation event from inside test.')
-        time.sleep(1)
+    assert camera.wait_for_observation(timeout=60)
+    assert camera.is_observing is False
     observation_pattern = os.path.join(images_dir, 'TestObservation',
                                        camera.uid, observation.seq_time, '*.fits*')
     assert len(glob.glob(observation_pattern)) == 1
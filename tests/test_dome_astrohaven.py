@@ -78,3 +78,15 @@ def test_open_and_close_slit(dome):
     assert dome.close() is True
 
     dome.disconnect()
+
+
+def test_get_status(dome):
+    dome.connect()
+
+    assert dome.open() is True
+    assert dome.get_status() == dict(is_connected=True, is_open=True, is_closed=False)
+
+    assert dome.close() is True
+    assert dome.get_status() == dict(is_connected=True, is_open=False, is_closed=True)
+
+    dome.disconnect()
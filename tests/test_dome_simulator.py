@@ -55,3 +55,13 @@ def test_open_and_close_slit(dome):
     assert dome.is_closed is True
 
     assert dome.disconnect() is True
+
+
+def test_get_status(dome):
+    dome.connect()
+
+    dome.open()
+    assert dome.get_status() == dict(is_connected=True, is_open=True, is_closed=False)
+
+    dome.close()
+    assert dome.get_status() == dict(is_connected=True, is_open=False, is_closed=True)
@@ -0,0 +1,263 @@
+# Test the gphoto2 output parsing using canned output, no camera needed.
+import os
+import subprocess
+import sys
+
+import pytest
+from astropy import units as u
+from panoptes.utils import error
+
+from panoptes.pocs.camera.gphoto.canon import Camera
+from panoptes.pocs.camera.gphoto.canon import SHUTTER_SPEEDS
+
+
+@pytest.fixture(scope='module')
+def camera():
+    return Camera(connect=False, port='usb:001,002')
+
+
+def test_get_config_values(camera):
+    lines = [
+        b'Label: Serial Number',
+        b'Readonly: 0',
+        b'Type: TEXT',
+        b'Current: 123456789012',
+        b'END',
+        b'Label: PTP Property 0xd402',
+        b'Readonly: 0',
+        b'Type: TEXT',
+        b'Current: Canon EOS 100D',
+        b'END',
+    ]
+    values = camera.get_config_values(lines, ['serialnumber', 'd402'])
+    assert values == {'serialnumber': '123456789012', 'd402': 'Canon EOS 100D'}
+
+
+def test_get_config_values_error(camera):
+    # The shell writes the errors to the same output as the values.
+    lines = [
+        b'*** Error ***              ',
+        b'serialnumber not found in configuration tree.',
+        b"*** Error (-1: 'Unspecified error') ***       ",
+        b'Label: PTP Property 0xd402',
+        b'Readonly: 0',
+        b'Type: TEXT',
+        b'Current: Canon EOS 100D',
+        b'END',
+    ]
+    values = camera.get_config_values(lines, ['serialnumber', 'd402'])
+    assert values == {'serialnumber': '', 'd402': 'Canon EOS 100D'}
+
+
+def test_get_config_values_missing_end(camera):
+    lines = [
+        b'Label: Serial Number',
+        b'Current: 123456789012',
+    ]
+    values = camera.get_config_values(lines, ['serialnumber', 'd402'])
+    assert values == {'serialnumber': '123456789012', 'd402': ''}
+
+    assert camera.get_config_values(None, ['serialnumber']) == {'serialnumber': ''}
+
+
+def test_get_shell_lines(camera):
+    cmd = ['--get-config', 'serialnumber',
+           '--set-config-value', 'artist=Big Telescope',
+           '--set-config-index', 'iso=1']
+    assert camera._get_shell_lines(cmd) == [
+        'get-config serialnumber',
+        'set-config-value "artist=Big Telescope"',
+        'set-config-index iso=1',
+    ]
+
+    # Anything without a shell command is run as a single gphoto2 process.
+    assert camera._get_shell_lines(['--list-all-config']) is None
+    assert camera._get_shell_lines(['--get-config', 'iso', '--capture-image-and-download']) is None
+    assert camera._get_shell_lines(['--filename', 'foo.cr2']) is None
+    assert camera._get_shell_lines([]) is None
+
+
+def test_read_lines(camera):
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'Label: ISO Speed\nCurrent: 100\nEND')
+    os.close(write_fd)
+    try:
+        lines = list(camera._read_lines(read_fd, timeout=1))
+    finally:
+        os.close(read_fd)
+
+    assert lines == [b'Label: ISO Speed', b'Current: 100', b'END']
+
+
+def test_read_lines_timeout(camera):
+    read_fd, write_fd = os.pipe()
+    os.write(write_fd, b'Label: ISO Speed\nCurrent: 1')
+    lines = list()
+    try:
+        with pytest.raises(TimeoutError):
+            for line in camera._read_lines(read_fd, timeout=0.1):
+                lines.append(line)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+    # The complete lines are yielded before the timeout.
+    assert lines == [b'Label: ISO Speed']
+
+
+def fake_shell(stdout, stderr):
+    """Start a process that writes like `gphoto2 --shell` then waits for a command."""
+    script = ('import sys; '
+              f'sys.stdout.buffer.write({stdout!r}); sys.stdout.flush(); '
+              f'sys.stderr.buffer.write({stderr!r}); sys.stderr.flush(); '
+              'sys.stdin.readline()')
+    return subprocess.Popen([sys.executable, '-c', script],
+                            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+
+@pytest.mark.parametrize('stdout,stderr,expected', [
+    (b'Label: ISO Speed\nCurrent: 100\nEND\n',
+     b'*** Error ***\n/__end_1__ not found in configuration tree.\n',
+     [b'Label: ISO Speed', b'Current: 100', b'END']),
+    # Errors are logged rather than returned, as for a single command.
+    (b'',
+     b'*** Error ***\nserialnumber not found in configuration tree.\n'
+     b'*** Error ***\n/__end_1__ not found in configuration tree.\n',
+     []),
+    # A partial line is still being written, so the command is rerun.
+    (b'Label: ISO Speed\nCurrent: 1',
+     b'/__end_1__ not found in configuration tree.\n',
+     [b'rerun']),
+])
+def test_get_shell_result(camera, monkeypatch, stdout, stderr, expected):
+    rerun = list()
+    monkeypatch.setattr(camera, '_start_command', rerun.append)
+    monkeypatch.setattr(camera, 'get_command_result', lambda timeout: [b'rerun'])
+
+    camera._shell = fake_shell(stdout, stderr)
+    camera._shell_cmd = ['--get-config', 'iso']
+    camera._shell_marker = '/__end_1__'
+    try:
+        assert camera._get_shell_result(timeout=5) == expected
+    finally:
+        camera.stop_shell()
+
+    assert rerun == ([['--get-config', 'iso']] if expected == [b'rerun'] else [])
+
+
+def test_disconnect_stops_shell(camera):
+    shell = fake_shell(b'', b'')
+    camera._shell = shell
+    camera.disconnect()
+
+    assert camera._shell is None
+    assert shell.poll() is not None
+    assert camera.is_connected is False
+
+
+def test_load_properties(camera, monkeypatch):
+    lines = [
+        b'/main/imgsettings/iso',
+        b'Label: ISO Speed',
+        b'Readonly: 0',
+        b'Type: RADIO',
+        b'Current: 100',
+        b'Choice: 0 Auto',
+        b'Choice: 1 100',
+        b'Choice: 2 200',
+        b'END',
+        b'/main/status/serialnumber',
+        b'Label: Serial Number',
+        b'Readonly: 1',
+        b'Type: TEXT',
+        b'Current: 123456789012',
+        b'END',
+        # The output can end before the last END line.
+        b'/main/status/batterylevel',
+        b'Label: Battery Level',
+        b'Readonly: 1',
+        b'Type: TEXT',
+        b'Current: 100%',
+    ]
+    monkeypatch.setattr(camera, 'command', lambda cmd: None)
+    monkeypatch.setattr(camera, 'iter_command_result', lambda: iter(lines))
+
+    properties = camera.load_properties(refresh=True)
+    assert list(properties) == ['ISO Speed', 'Serial Number', 'Battery Level']
+    assert properties['ISO Speed'] == {
+        'ID': '/main/imgsettings/iso',
+        'Label': 'ISO Speed',
+        'Readonly': 0,
+        'Type': 'RADIO',
+        'Current': '100',
+        'Choices': {0: 'Auto', 1: '100', 2: '200'},
+    }
+    assert properties['Serial Number']['Readonly'] == 1
+    assert properties['Battery Level']['Current'] == '100%'
+
+    # The properties are cached until a config value is set.
+    assert camera.load_properties() is properties
+
+
+def test_load_properties_error(camera, monkeypatch):
+    lines = [
+        b'*** Error ***              ',
+        b'An error occurred in the io-library',
+        b'Current: 100',
+    ]
+    monkeypatch.setattr(camera, 'command', lambda cmd: None)
+    monkeypatch.setattr(camera, 'iter_command_result', lambda: iter(lines))
+
+    assert camera.load_properties(refresh=True) == dict()
+
+
+@pytest.mark.parametrize('seconds,idx', [
+    ('bulb', 0),
+    ('30', 1),
+    (30, 1),
+    (30 * u.second, 1),
+    (30000 * u.ms, 1),
+    ('1/4', 22),
+    (1 / 4, 22),
+    (60, 0),
+    (0.7, 0),
+])
+def test_get_shutterspeed_index(seconds, idx):
+    assert Camera.get_shutterspeed_index(seconds) == idx
+
+
+def test_get_shutterspeed_index_minimum():
+    fastest = len(SHUTTER_SPEEDS) - 1
+    assert Camera.get_shutterspeed_index(1 / 8000, return_minimum=True) == fastest
+    assert Camera.get_shutterspeed_index(1 / 8000) == 0
+    assert Camera.get_shutterspeed_index(1 / 4000, return_minimum=True) == fastest
+
+
+def test_process_exposure_conversion_error(camera, tmp_path):
+    # The conversion fails in the worker process as there is no file.
+    camera._is_observing_event.set()
+    metadata = dict(exptime=1, filepath=str(tmp_path / 'missing.cr2'))
+    camera.process_exposure(metadata)
+
+    assert metadata['filepath'] == str(tmp_path / 'missing.cr2')
+    assert camera.is_observing is False
+
+
+@pytest.mark.parametrize('serial_number', ['123456789012', ''])
+def test_connect(serial_number, monkeypatch):
+    camera = Camera(connect=False, port='usb:001,002')
+    calls = list()
+    values = {'serialnumber': serial_number, 'd402': 'Canon EOS 100D'}
+    monkeypatch.setattr(camera, 'get_property', lambda prop: calls.append(prop) or values[prop])
+    monkeypatch.setattr(camera, 'set_properties', lambda **kwargs: calls.append('set'))
+
+    if serial_number:
+        camera.connect()
+        assert camera.uid == '123456'
+        assert camera.model == 'Canon EOS 100D'
+        # The camera is queried before the settings are sent.
+        assert calls == ['serialnumber', 'd402', 'set']
+    else:
+        with pytest.raises(error.CameraNotFound):
+            camera.connect()
+        assert calls == ['serialnumber']
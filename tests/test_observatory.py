@@ -1,16 +1,25 @@
 import os
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
+import numpy as np
 import pytest
+
+from astropy import units as u
+from astropy.io import fits
 from astropy.time import Time
 from panoptes.pocs import __version__
 from panoptes.utils import error
+from panoptes.utils.config.client import get_config
 from panoptes.utils.config.client import set_config
 from panoptes.utils.serializers import to_json
 from panoptes.pocs import hardware
 from panoptes.pocs.mount import AbstractMount
 from panoptes.pocs.observatory import Observatory
 from panoptes.pocs.scheduler.dispatch import Scheduler
+from panoptes.pocs.scheduler.observation.base import Exposure
 from panoptes.pocs.scheduler.observation.base import Observation
 from panoptes.pocs.mount import create_mount_from_config
 from panoptes.pocs.mount import create_mount_simulator
@@ -40,6 +49,24 @@ def mount():
     return create_mount_simulator()
 
 
+@pytest.fixture(scope='function')
+def dome_log(tmp_path):
+    """Set a simulated dome with its operation log in a temporary directory."""
+    operation_log = tmp_path / 'dome_operations.log'
+    set_config('dome', {
+        'brand': 'Simulacrum',
+        'driver': 'simulator',
+        'operation_log': str(operation_log),
+    })
+    return operation_log
+
+
+@pytest.fixture(scope='function')
+def dome_observatory(dome_log):
+    """Return an Observatory with only a simulated dome."""
+    return Observatory(dome=create_dome_simulator())
+
+
 @pytest.fixture(scope='function')
 def observatory(mount, cameras, images_dir):
     """Return a valid Observatory instance with a specific config."""
@@ -105,7 +132,7 @@ def test_camera_wrong_type():
     with pytest.raises(AttributeError):
         Observatory(cameras=[Time.now()])
 
-    with pytest.raises(AssertionError):
+    with pytest.raises(TypeError, match='Camera is not an instance of .*AbstractCamera'):
         Observatory(cameras={'Cam00': Time.now()})
 
 
@@ -124,6 +151,16 @@ def test_primary_camera_no_primary_camera(observatory):
     assert observatory.primary_camera is not None
 
 
+def test_primary_camera_removed(observatory):
+    primary_camera = observatory.primary_camera
+    cam_name = [name for name, cam in observatory.cameras.items() if cam is primary_camera][0]
+    observatory.remove_camera(cam_name)
+    assert observatory.primary_camera is not primary_camera
+
+    if observatory.has_cameras:
+        assert observatory.primary_camera is next(iter(observatory.cameras.values()))
+
+
 def test_set_scheduler(observatory, caplog):
     site_details = create_location_from_config()
     scheduler = create_scheduler_from_config(observer=site_details['observer'])
@@ -145,14 +182,9 @@ def test_set_scheduler(observatory, caplog):
         observatory.set_scheduler()
 
 
-def test_set_dome():
-    set_config('dome', {
-        'brand': 'Simulacrum',
-        'driver': 'simulator',
-    })
-    dome = create_dome_simulator()
-
-    obs = Observatory(dome=dome)
+def test_set_dome(dome_observatory):
+    obs = dome_observatory
+    dome = obs.dome
     assert obs.has_dome is True
     obs.set_dome(dome=None)
     assert obs.has_dome is False
@@ -211,6 +243,74 @@ def test_status(observatory):
     assert 'observation' in status3
 
 
+def test_status_given_time(observatory):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.mount.initialize(unpark=True)
+    observatory.get_observation()
+
+    now = Time('2016-08-13 22:00:00')
+    status = observatory.get_status(now=now)
+    assert status['observer']['utctime'] is now
+    assert status['observer']['siderealtime'] == str(observatory._local_sidereal_time(now))
+
+    field = observatory.current_observation.field
+    field_ha = observatory.observer.target_hour_angle(now, field)
+    assert status['observation']['field_ha'].value == pytest.approx(field_ha.value, abs=1e-6)
+
+    headers = observatory.get_standard_headers(now=now)
+    assert headers['ha_mnt'] == pytest.approx(field_ha.value, abs=1e-6)
+
+
+def test_status_sun_events(observatory):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory._morning_astro_time = Time('2016-08-13 14:00:00')
+    status = observatory.status
+    morning_astro_time = status['observer']['local_morning_astro_time']
+    assert morning_astro_time > Time('2016-08-13 15:00:00')
+
+    # No recompute until the next morning.
+    assert observatory.status['observer']['local_morning_astro_time'] is morning_astro_time
+
+
+def test_status_ephemeris_cache(observatory):
+    t0 = Time('2016-08-13 22:00:00')
+
+    moon = observatory._cached_moon(t0)
+    assert observatory._cached_moon(t0) is moon
+    assert observatory._cached_moon_illumination(t0) == pytest.approx(
+        observatory.observer.moon_illumination(t0), rel=1e-3)
+    assert observatory._cached_moon_altaz(t0).alt.value == pytest.approx(
+        observatory.observer.moon_altaz(t0).alt.value, rel=1e-3)
+
+    for i in range(100):
+        observatory._cached_sun(t0 + i * u.second)
+    assert len(observatory._ephemeris_cache) <= 32
+
+
+def test_ephemeris_cache_threads(observatory):
+    t0 = Time('2016-08-13 22:00:00')
+
+    def lookup(offset):
+        for i in range(50):
+            observatory._cached_ephemeris(t0 + (offset + i) * u.second, 'test', lambda t: t.jd)
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(lookup, range(0, 200, 50)))
+
+    assert len(observatory._ephemeris_cache) == 32
+
+
+def test_config_cache(observatory):
+    assert observatory._cfg('observations.make_pretty_images', False) is False
+
+    set_config('observations.make_pretty_images', True)
+    assert observatory._cfg('observations.make_pretty_images', False) is False
+
+    observatory.clear_config_cache()
+    assert observatory._cfg('observations.make_pretty_images', False) is True
+    set_config('observations.make_pretty_images', False)
+
+
 def test_default_config(observatory):
     """ Creates a default Observatory and tests some of the basic parameters """
 
@@ -241,6 +341,19 @@ def test_is_dark(observatory):
     assert observatory.is_dark(horizon='invalid-defaults-to-observe') is True
 
 
+def test_is_dark_vector(observatory):
+    times = Time(['2016-08-13 10:00:00', '2016-08-13 22:00:00',
+                  '2016-09-09 04:00:00', '2016-09-09 05:00:00'])
+
+    is_dark = observatory.is_dark_vector(times)
+    assert is_dark.shape == (4,)
+    assert is_dark.tolist() == [True, False, False, False]
+    assert observatory.is_dark_vector(times, horizon='flat').tolist() == [True, False, False, True]
+
+    for t, dark in zip(times, is_dark):
+        assert observatory.is_dark(at_time=t) is bool(dark)
+
+
 def test_standard_headers(observatory):
     os.environ['POCSTIME'] = '2016-08-13 22:00:00'
 
@@ -278,6 +391,70 @@ def test_standard_headers(observatory):
     assert headers['longitude'] == test_headers['longitude']
 
 
+def test_post_pool(observatory):
+    future = observatory._submit_post('getpid', os.getpid)
+    assert future.result(timeout=60) != os.getpid()
+
+    with pytest.raises(FileNotFoundError):
+        observatory._submit_post('stat', os.stat, '/not/a/file').result(timeout=60)
+
+    observatory.power_down()
+    assert observatory._post_pool is None
+
+    # Pool is recreated on demand.
+    assert observatory._submit_post('getpid', os.getpid).result(timeout=60) != os.getpid()
+    observatory.power_down()
+
+
+def test_upload_exposure_batches(observatory, images_dir):
+    submitted = list()
+    observatory._submit_post = lambda name, func, *args, **kwargs: submitted.append(
+        (func, args, kwargs))
+
+    for i in range(3):
+        image_path = Path(images_dir) / f'upload-{i}.fits'
+        image_path.touch()
+        exposure = Exposure(image_id=f'image-{i}', path=image_path, metadata=dict())
+        observatory.upload_exposure(exposure, bucket_name='test-bucket')
+
+    # Missing files are left for the uploader to skip.
+    exposure = Exposure(image_id='missing', path=Path(images_dir) / 'missing.fits',
+                        metadata=dict())
+    observatory.upload_exposure(exposure, bucket_name='test-bucket')
+
+    observatory.power_down()
+
+    assert len(submitted) == 1
+    func, args, kwargs = submitted[0]
+    assert kwargs['bucket_name'] == 'test-bucket'
+    assert [p.name for p, _ in args[0]] == ['upload-0.fits', 'upload-1.fits', 'upload-2.fits',
+                                            'missing.fits']
+
+
+def test_upload_exposure_config_change(observatory, images_dir):
+    submitted = list()
+    observatory._submit_post = lambda name, func, *args, **kwargs: submitted.append(args)
+
+    # Other tests can reset the config, so use the images directory directly.
+    observatory._image_dir = str(Path(images_dir).absolute())
+    image_path = Path(images_dir) / 'upload-config.fits'
+    image_path.touch()
+    exposure = Exposure(image_id='image-config', path=image_path, metadata=dict())
+
+    pan_id = get_config('pan_id')
+    try:
+        set_config('pan_id', 'PAN999')
+        # The new value is used once the config cache is cleared.
+        observatory.clear_config_cache()
+        observatory.upload_exposure(exposure, bucket_name='test-bucket')
+        observatory.power_down()
+    finally:
+        set_config('pan_id', pan_id)
+
+    (_, bucket_path), = submitted[0][0]
+    assert bucket_path == 'PAN999/upload-config.fits'
+
+
 def test_sidereal_time(observatory):
     os.environ['POCSTIME'] = '2016-08-13 10:00:00'
     st = observatory.sidereal_time
@@ -317,6 +494,134 @@ def test_observe(observatory):
     observatory.observe()
     assert observatory.current_observation.current_exp_num == 1
 
+    for cam_name in observatory.cameras.keys():
+        exposure = observatory.current_observation.exposure_list[cam_name][-1]
+        assert 'trigger_time' in exposure.metadata
+
+
+def test_observe_not_blocking(observatory):
+    # The cooled cameras take a while to be ready.
+    for cam_name, camera in list(observatory.cameras.items()):
+        if not camera.is_ready:
+            observatory.remove_camera(cam_name)
+    assert observatory.has_cameras
+
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    observatory.observe(blocking=False)
+
+    for camera in observatory.cameras.values():
+        assert camera.wait_for_observation(timeout=30)
+    assert observatory.current_observation.current_exp_num == 1
+
+
+def test_observe_no_cameras(observatory):
+    for cam_name in list(observatory.cameras.keys()):
+        observatory.remove_camera(cam_name)
+    assert observatory.primary_camera is None
+
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    observatory.observe(blocking=False)
+
+
+def test_power_down_stops_threads(observatory):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    camera_thread = observatory._camera_executor.submit(threading.current_thread).result()
+    dome_thread = observatory._dome_executor.submit(threading.current_thread).result()
+
+    observatory.power_down()
+
+    assert not camera_thread.is_alive()
+    assert not dome_thread.is_alive()
+
+
+def make_exposures(observatory, images_dir, timestamp='20160813T150000', write=False, add=True):
+    """Make an exposure for each camera, optionally writing the file and recording it."""
+    exposures = dict()
+    for cam_name in observatory.cameras.keys():
+        image_id = f'{cam_name}_{timestamp}'
+        file_path = Path(images_dir) / f'{image_id}.fits'
+        if write:
+            fits.PrimaryHDU(np.zeros((10, 10))).writeto(file_path, overwrite=True)
+        metadata = dict(image_id=image_id,
+                        sequence_id=f'{cam_name}_seq',
+                        filepath=str(file_path),
+                        exptime=1.0,
+                        is_primary=False)
+        exposures[cam_name] = Exposure(image_id=image_id, path=file_path, metadata=metadata)
+        if add:
+            observatory.current_observation.add_to_exposure_list(cam_name, exposures[cam_name])
+
+    return exposures
+
+
+def test_process_observation(observatory, images_dir):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    make_exposures(observatory, images_dir)
+
+    observatory.process_observation(record_observations=True)
+
+    for cam_name in observatory.cameras.keys():
+        exposure = observatory.current_observation.exposure_list[cam_name][-1]
+        assert exposure.metadata['status'] == 'complete'
+
+
+def test_process_observation_exposures(observatory, images_dir):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+
+    exposures = make_exposures(observatory, images_dir)
+    # The next exposures are added before the processing starts.
+    next_exposures = make_exposures(observatory, images_dir, timestamp='20160813T150100')
+
+    observatory.process_observation(record_observations=True, exposures=exposures)
+
+    for exposure in exposures.values():
+        assert exposure.metadata['status'] == 'complete'
+    for exposure in next_exposures.values():
+        assert 'status' not in exposure.metadata
+
+
+def test_process_observation_skip_complete(observatory, images_dir):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    exposures = make_exposures(observatory, images_dir, add=False)
+
+    # Only the first camera has already been processed.
+    first, *others = exposures.values()
+    assert len(others) > 0
+    first.metadata['status'] = 'complete'
+
+    observatory.process_observation(record_observations=True, exposures=exposures)
+
+    for exposure in others:
+        assert exposure.metadata['status'] == 'complete'
+
+
+@pytest.mark.parametrize('plate_solve', [False, True])
+def test_process_observation_compress(observatory, images_dir, plate_solve):
+    os.environ['POCSTIME'] = '2016-08-13 15:00:00'
+    observatory.get_observation()
+    make_exposures(observatory, images_dir, write=True)
+
+    observatory.process_observation(compress_fits=True,
+                                    record_observations=True,
+                                    plate_solve=plate_solve)
+
+    for cam_name in observatory.cameras.keys():
+        exposure = observatory.current_observation.exposure_list[cam_name][-1]
+        # The compression has been waited on and the new path recorded.
+        assert exposure.fpack_future is None
+        assert exposure.path.exists()
+        assert exposure.metadata['filepath'] == str(exposure.path)
+        if plate_solve:
+            assert exposure.solve_future.done()
+        else:
+            assert exposure.solve_future is None
+
 
 def test_autofocus_disconnected(observatory):
     # 'Disconnect' simulated cameras which will cause
@@ -386,21 +691,10 @@ def test_no_dome(observatory):
     assert observatory.close_dome()
 
 
-def test_operate_dome():
+def test_operate_dome(dome_observatory):
     # Remove dome and night simulator
     set_config('simulator', hardware.get_all_names(without=['dome', 'night']))
-
-    set_config('dome', {
-        'brand': 'Simulacrum',
-        'driver': 'simulator',
-    })
-
-    set_config('dome', {
-        'brand': 'Simulacrum',
-        'driver': 'simulator',
-    })
-    dome = create_dome_simulator()
-    observatory = Observatory(dome=dome)
+    observatory = dome_observatory
 
     assert observatory.has_dome
     assert observatory.open_dome()
@@ -418,3 +712,79 @@ def test_operate_dome():
     assert observatory.open_dome()
     assert observatory.dome.is_open
     assert not observatory.dome.is_closed
+
+
+def test_operate_dome_connects_once(dome_observatory):
+    observatory = dome_observatory
+    dome = observatory.dome
+
+    connect_calls = list()
+    connect = dome.connect
+    dome.connect = lambda: connect_calls.append(True) or connect()
+
+    assert observatory.open_dome()
+    assert observatory.close_dome()
+    assert observatory.open_dome()
+    assert len(connect_calls) == 1
+
+    # Reconnects after a disconnect.
+    dome.disconnect()
+    assert observatory.close_dome()
+    assert len(connect_calls) == 2
+
+
+def test_close_dome_not_blocking(dome_observatory, dome_log):
+    observatory = dome_observatory
+    assert observatory.open_dome()
+
+    logged = list()
+    log_dome_operation = observatory._log_dome_operation
+    observatory._log_dome_operation = lambda op: logged.append(op) or log_dome_operation(op)
+
+    future = observatory.close_dome(blocking=False)
+    assert future.result(timeout=10) is True
+    assert observatory.dome.is_closed
+
+    # The close is logged and the log is emptied once the dome is closed.
+    assert logged == ['close_dome']
+    assert dome_log.read_text() == ''
+
+
+def test_dome_log_path(dome_log, tmp_path, config_host, config_port):
+    # An absolute path is used as is.
+    assert Observatory()._dome_log_path == dome_log
+
+    # A relative path is under the base directory rather than the working directory.
+    set_config('directories.base', str(tmp_path))
+    set_config('dome.operation_log', 'logs/dome.log')
+    assert Observatory()._dome_log_path == tmp_path / 'logs' / 'dome.log'
+
+    reset_conf(config_host, config_port)
+
+
+def test_close_dome_replayed(dome_log):
+    # The log is written before the observatory is created.
+    dome_log.write_text(to_json(dict(op='close_dome', ts=time.time())) + '\n')
+    observatory = Observatory(dome=create_dome_simulator())
+
+    # The unfinished close is sent again when the observatory starts.
+    observatory._dome_executor.submit(lambda: None).result(timeout=10)
+    assert observatory.dome.is_closed
+    assert dome_log.read_text() == ''
+
+
+def test_close_dome_already_closed(dome_observatory):
+    observatory = dome_observatory
+    assert observatory.close_dome()
+
+    close_calls = list()
+    close = observatory.dome.close
+    observatory.dome.close = lambda: close_calls.append(True) or close()
+    logged = list()
+    observatory._log_dome_operation = logged.append
+
+    # The dome isn't asked to close again and nothing is logged.
+    assert observatory.close_dome()
+    assert observatory.dome.is_closed
+    assert close_calls == []
+    assert logged == []
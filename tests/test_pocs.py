@@ -90,10 +90,12 @@ def pocs(observatory, config_host, config_port):
 
 
 @pytest.fixture(scope='function')
-def pocs_with_dome(pocs, dome):
+def pocs_with_dome(pocs, dome, tmp_path):
     # Add dome to config
     os.environ['POCSTIME'] = '2020-01-01 08:00:00'
     pocs.observatory.set_dome(dome)
+    # Keep the dome operation log out of the working directory.
+    pocs.observatory._dome_log_path = tmp_path / 'dome_operations.log'
     yield pocs
     pocs.power_down()
 